@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Emergent OAuth session-data endpoint, for tests.
+
+    uvicorn auth_stub_server:app --port 8002
+    AUTH_SESSION_DATA_URL=http://localhost:8002/auth/v1/env/oauth/session-data uvicorn server:app
+
+Any X-Session-ID is accepted and mapped to a deterministic user, except
+"invalid", which returns 401 like the real service does for unknown ids.
+"""
+
+from fastapi import FastAPI, HTTPException, Request
+
+app = FastAPI()
+
+
+@app.get("/auth/v1/env/oauth/session-data")
+async def session_data(request: Request):
+    session_id = request.headers.get("X-Session-ID")
+    if not session_id or session_id == "invalid":
+        raise HTTPException(status_code=401, detail="Invalid session")
+
+    return {
+        "id": f"stub-user-{session_id}",
+        "email": f"{session_id}@example.com",
+        "name": f"Stub User {session_id}",
+        "picture": None,
+        "session_token": f"stub_session_{session_id}"
+    }
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Auth resolution benchmark: two sequential find_one calls (session, then user)
+versus the single $lookup aggregation used by get_current_user.
+
+    python benchmarks/auth_lookup_benchmark.py [--mongo-url mongodb://localhost:27017]
+
+mongomock has no network hop, so --rtt-ms adds a simulated round trip per
+database call when running against the stand-in.
+"""
+
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from common import base_parser, get_database, summarize, time_async
+
+import server
+
+
+async def seed(db, users: int):
+    now = datetime.now(timezone.utc)
+    await db.users.delete_many({})
+    await db.user_sessions.delete_many({})
+    await db.users.insert_many([
+        {"_id": f"bench-user-{i}", "email": f"bench{i}@example.com", "name": f"Bench {i}", "created_at": now}
+        for i in range(users)
+    ])
+    await db.user_sessions.insert_many([
+        {"user_id": f"bench-user-{i}", "session_token": f"bench_session_{i}",
+         "expires_at": now + timedelta(days=7), "created_at": now}
+        for i in range(users)
+    ])
+    await db.user_sessions.create_index("session_token", unique=True)
+
+
+RTT = {"seconds": 0.0}
+
+
+async def round_trip():
+    if RTT["seconds"]:
+        await asyncio.sleep(RTT["seconds"])
+
+
+async def two_queries(db, token: str):
+    """Previous get_current_user path"""
+    await round_trip()
+    session = await db.user_sessions.find_one({
+        "session_token": token,
+        "expires_at": {"$gt": datetime.now(timezone.utc)}
+    })
+    if not session:
+        return None
+    await round_trip()
+    return await db.users.find_one({"_id": session["user_id"]})
+
+
+async def single_lookup(db, token: str):
+    await round_trip()
+    sessions = await db.user_sessions.aggregate(server.session_user_pipeline(token)).to_list(1)
+    return sessions[0]["user"] if sessions else None
+
+
+async def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="Simulated round trip per DB call")
+    args = parser.parse_args()
+    RTT["seconds"] = args.rtt_ms / 1000
+
+    db = get_database(args.mongo_url, args.db_name)
+    await seed(db, args.users)
+
+    counter = {"i": 0}
+
+    def next_token():
+        counter["i"] += 1
+        return f"bench_session_{counter['i'] % args.users}"
+
+    # Both paths must resolve the same user before we time them
+    token = next_token()
+    assert (await two_queries(db, token))["_id"] == (await single_lookup(db, token))["_id"]
+
+    print(f"🔧 Auth lookup benchmark ({'mongod' if args.mongo_url else 'mongomock'}, "
+          f"{args.users} users, {args.iterations} iterations, rtt {args.rtt_ms} ms)")
+    for name, fn in [("two_queries", two_queries), ("single_lookup", single_lookup)]:
+        samples = await time_async(lambda: fn(db, next_token()), args.iterations)
+        stats = summarize(samples)
+        print(f"   {name:<14} mean {stats['mean_ms']:.3f} ms  p50 {stats['p50_ms']:.3f} ms  "
+              f"p95 {stats['p95_ms']:.3f} ms  p99 {stats['p99_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
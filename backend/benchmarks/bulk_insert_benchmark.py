@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Fuel sale insert throughput: one POST /fuel-sales per record versus
+POST /fuel-sales/bulk batches, both through the app in-process.
+
+    python benchmarks/bulk_insert_benchmark.py [--mongo-url mongodb://localhost:27017]
+"""
+
+import asyncio
+import time
+
+from common import app_client, base_parser, create_session, get_database
+
+
+def fuel_sale(i: int) -> dict:
+    opening = 10000.0 + i * 50
+    return {
+        "date": f"2025-01-{1 + i % 28:02d}",
+        "fuel_type": "Petrol" if i % 3 else "Diesel",
+        "nozzle_id": f"N{i % 12 + 1}",
+        "opening_reading": opening,
+        "closing_reading": opening + 50,
+        "liters": 50.0,
+        "rate": 102.5,
+        "amount": 5125.0
+    }
+
+
+async def single_inserts(client, records: list) -> float:
+    started = time.perf_counter()
+    for record in records:
+        response = await client.post("/fuel-sales", json=record)
+        response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def bulk_inserts(client, records: list, batch_size: int) -> float:
+    started = time.perf_counter()
+    for offset in range(0, len(records), batch_size):
+        response = await client.post("/fuel-sales/bulk", json=records[offset:offset + batch_size])
+        response.raise_for_status()
+        assert response.json()["failed"] == 0
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=36, help="e.g. 12 nozzles x 3 shifts")
+    args = parser.parse_args()
+
+    db = get_database(args.mongo_url, args.db_name)
+    token = await create_session(db)
+    records = [fuel_sale(i) for i in range(args.records)]
+
+    print(f"🔧 Insert throughput ({'mongod' if args.mongo_url else 'mongomock'}, "
+          f"{args.records} records, batch size {args.batch_size})")
+    async with app_client(db, token) as client:
+        for name, run in [
+            ("single", lambda: single_inserts(client, records)),
+            ("bulk", lambda: bulk_inserts(client, records, args.batch_size)),
+        ]:
+            await db.fuel_sales.delete_many({})
+            await db.daily_rollups.delete_many({})
+            seconds = await run()
+            print(f"   {name:<7} {seconds:.2f} s  {args.records / seconds:,.0f} records/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
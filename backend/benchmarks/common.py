@@ -0,0 +1,100 @@
+"""
+Shared helpers for the backend benchmarks.
+
+Benchmarks run against a real mongod when --mongo-url is given and fall back
+to an in-memory mongomock stand-in otherwise (pip install mongomock-motor).
+"""
+
+import argparse
+import logging
+import statistics
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def base_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--mongo-url", help="Run against this mongod instead of mongomock")
+    parser.add_argument("--db-name", default="benchmark_database")
+    return parser
+
+
+def get_database(mongo_url, db_name):
+    """Return a Motor database for mongo_url, or a mongomock stand-in"""
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient(mongo_url)[db_name]
+
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("mongomock-motor is not installed; pass --mongo-url or pip install mongomock-motor")
+    return AsyncMongoMockClient()[db_name]
+
+
+def summarize(samples: list) -> dict:
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+    }
+
+
+async def time_async(fn, iterations: int) -> list:
+    """Await fn() iterations times and return the individual durations"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def create_session(db, user_id: str = "bench-user", token: str = "bench_session") -> str:
+    """Insert a user and a valid session, returning the session token"""
+    now = datetime.now(timezone.utc)
+    await db.users.update_one(
+        {"_id": user_id},
+        {"$set": {"email": f"{user_id}@example.com", "name": "Bench User", "created_at": now}},
+        upsert=True
+    )
+    await db.user_sessions.delete_many({"user_id": user_id})
+    await db.user_sessions.insert_one({
+        "user_id": user_id,
+        "session_token": token,
+        "expires_at": now + timedelta(days=7),
+        "created_at": now
+    })
+    return token
+
+
+def app_client(db, token: str):
+    """httpx client calling a freshly built app in-process, with server.db pointed at db"""
+    import httpx
+    import server
+
+    # Per-request log lines would swamp the benchmark output
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("server").setLevel(logging.WARNING)
+    logging.getLogger("request_stats").setLevel(logging.ERROR)
+    server.db = db
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=server.create_app()),
+        base_url="http://benchmark/api",
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=60.0
+    )
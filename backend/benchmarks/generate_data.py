@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Synthetic petrol-pump ledgers for N users x M nozzles x D days, bulk-loaded
+with insert_many.
+
+    python benchmarks/generate_data.py --mongo-url mongodb://localhost:27017 \\
+        [--users 10] [--nozzles 8] [--days 730] [--shifts 2] [--drop]
+
+Without --mongo-url the data goes into mongomock, which is only useful for
+checking the generator itself.
+
+The data follows how a pump actually runs:
+- Each nozzle dispenses one fuel type. Its meter only moves forward, so
+  every shift's opening reading is the previous shift's closing reading.
+- Daily volume follows a weekly pattern (busier weekends), slow growth and
+  noise.
+- Rates per fuel type change every few weeks by small steps, and each sale
+  uses the rate in force on its date.
+- Credit sales arrive at a Poisson rate from a pool of regular customers,
+  a few of whom account for most of the volume.
+- Expenses are monthly fixed costs plus irregular running costs; income is
+  lubricant and other sales.
+
+Users get sessions (datagen_session_<i>) so the API can be driven against
+the generated data. Generation is seeded and deterministic.
+"""
+
+import asyncio
+import math
+import random
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, Tuple
+
+from common import base_parser, create_session, get_database
+
+from rollups import rebuild_rollups
+
+COLLECTIONS = ("fuel_sales", "credit_sales", "income_expenses", "fuel_rates")
+
+# Share of nozzles per fuel type, starting rate and mean liters per nozzle per day
+FUEL_MIX = {"Petrol": 0.5, "Diesel": 0.4, "CNG": 0.1}
+BASE_RATES = {"Petrol": 102.5, "Diesel": 89.6, "CNG": 76.0}
+DAILY_LITERS = {"Petrol": 900.0, "Diesel": 1200.0, "CNG": 600.0}
+
+# Monday..Sunday volume factors
+WEEKDAY_FACTORS = (0.95, 0.93, 0.96, 1.0, 1.06, 1.14, 1.08)
+YEARLY_GROWTH = 0.04
+
+CREDIT_SALES_PER_DAY = 3.0
+CREDIT_CUSTOMERS = 60
+
+MONTHLY_EXPENSES = {"Salary": 85000.0, "Electricity": 22000.0, "Rent": 30000.0}
+RUNNING_EXPENSES = {"Maintenance": 2500.0, "Transport": 1200.0, "Misc": 600.0}
+INCOME = {"Lubricants": 1800.0, "Air/Water": 150.0, "Other": 900.0}
+
+
+def user_id(index: int) -> str:
+    return f"datagen-user-{index}"
+
+
+def session_token(index: int) -> str:
+    return f"datagen_session_{index}"
+
+
+def poisson(rng: random.Random, mean: float) -> int:
+    # Knuth's method; fine for the small means used here
+    threshold, count, product = math.exp(-mean), 0, rng.random()
+    while product > threshold:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def nozzle_fuel_types(nozzles: int) -> list:
+    """Fuel type per nozzle in roughly FUEL_MIX proportions"""
+    types = []
+    for fuel_type, share in FUEL_MIX.items():
+        types.extend([fuel_type] * max(1, round(nozzles * share)))
+    return (types + [types[0]] * nozzles)[:nozzles]
+
+
+def generate_user(owner: str, start: date, days: int, nozzles: int, shifts: int = 1,
+                  seed: int = 0) -> Iterator[Tuple[str, dict]]:
+    """Yield (collection, document) for one user's ledgers, day by day"""
+    rng = random.Random(f"{seed}:{owner}")
+
+    def record(day: date, minute: int, **fields) -> dict:
+        created_at = datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + timedelta(minutes=minute)
+        return {
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "user_id": owner,
+            "date": day.isoformat(),
+            **fields,
+            "created_at": created_at,
+            "updated_at": created_at,
+            "version": 1,
+            "deleted": False,
+            "deleted_at": None,
+        }
+
+    fuel_types = nozzle_fuel_types(nozzles)
+    readings = [round(rng.uniform(10000, 90000), 2) for _ in range(nozzles)]
+    rates = dict(BASE_RATES)
+    next_rate_change = {fuel_type: 0 for fuel_type in rates}
+    # A few regular customers account for most credit sales (Zipf-like weights)
+    customers = [f"Customer {i + 1}" for i in range(CREDIT_CUSTOMERS)]
+    customer_weights = [1 / (i + 1) for i in range(CREDIT_CUSTOMERS)]
+    shift_minutes = 24 * 60 // shifts
+
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+
+        for fuel_type in rates:
+            if offset == next_rate_change[fuel_type]:
+                if offset:
+                    rates[fuel_type] = round(rates[fuel_type] * (1 + rng.gauss(0.002, 0.01)), 2)
+                next_rate_change[fuel_type] = offset + rng.randint(10, 35)
+                yield "fuel_rates", record(day, 0, fuel_type=fuel_type, rate=rates[fuel_type])
+
+        volume = WEEKDAY_FACTORS[day.weekday()] * (1 + YEARLY_GROWTH * offset / 365)
+        for shift in range(shifts):
+            for nozzle, fuel_type in enumerate(fuel_types):
+                expected = DAILY_LITERS[fuel_type] * volume / shifts
+                liters = max(0.0, round(rng.gauss(expected, expected * 0.15), 2))
+                opening = readings[nozzle]
+                closing = round(opening + liters, 2)
+                readings[nozzle] = closing
+                liters = round(closing - opening, 2)
+                yield "fuel_sales", record(
+                    day, (shift + 1) * shift_minutes - 1,
+                    fuel_type=fuel_type,
+                    nozzle_id=f"N{nozzle + 1}",
+                    opening_reading=opening,
+                    closing_reading=closing,
+                    liters=liters,
+                    rate=rates[fuel_type],
+                    amount=round(liters * rates[fuel_type], 2),
+                )
+
+        for _ in range(poisson(rng, CREDIT_SALES_PER_DAY * volume)):
+            yield "credit_sales", record(
+                day, rng.randint(360, 1320),
+                customer_name=rng.choices(customers, customer_weights)[0],
+                amount=round(rng.lognormvariate(math.log(3000), 0.8), 2),
+                description=None,
+            )
+
+        if day.day == 1:
+            for category, amount in MONTHLY_EXPENSES.items():
+                yield "income_expenses", record(
+                    day, 600, type="expense", category=category,
+                    amount=round(amount * rng.uniform(0.95, 1.1), 2), description=None
+                )
+        for category, mean in RUNNING_EXPENSES.items():
+            if rng.random() < 0.3:
+                yield "income_expenses", record(
+                    day, rng.randint(480, 1200), type="expense", category=category,
+                    amount=round(rng.expovariate(1 / mean), 2), description=None
+                )
+        for category, mean in INCOME.items():
+            if rng.random() < 0.5:
+                yield "income_expenses", record(
+                    day, rng.randint(480, 1200), type="income", category=category,
+                    amount=round(rng.expovariate(1 / mean), 2), description=None
+                )
+
+
+async def load(db, documents: Iterator[Tuple[str, dict]], batch_size: int = 5000, parallel: int = 4) -> dict:
+    """insert_many documents per collection in batches, up to ``parallel`` batches in flight"""
+    counts = {collection: 0 for collection in COLLECTIONS}
+    buffers = {collection: [] for collection in COLLECTIONS}
+    slots = asyncio.Semaphore(parallel)
+    tasks = []
+
+    async def insert(collection: str, batch: list):
+        try:
+            await db[collection].insert_many(batch, ordered=False)
+        finally:
+            slots.release()
+
+    async def flush(collection: str):
+        batch, buffers[collection] = buffers[collection], []
+        counts[collection] += len(batch)
+        await slots.acquire()
+        tasks.append(asyncio.create_task(insert(collection, batch)))
+
+    for collection, document in documents:
+        buffers[collection].append(document)
+        if len(buffers[collection]) >= batch_size:
+            await flush(collection)
+    for collection in COLLECTIONS:
+        if buffers[collection]:
+            await flush(collection)
+    # Surface any insert error
+    await asyncio.gather(*tasks)
+    return counts
+
+
+async def generate(db, users: int, nozzles: int, days: int, start: date = None, shifts: int = 1,
+                   seed: int = 0, batch_size: int = 5000, parallel: int = 4, rollups: bool = True) -> dict:
+    """Create users with sessions and load their generated ledgers; returns per-collection counts"""
+    start = start or date.today() - timedelta(days=days)
+    counts = {collection: 0 for collection in COLLECTIONS}
+    for index in range(users):
+        await create_session(db, user_id(index), session_token(index))
+        loaded = await load(db, generate_user(user_id(index), start, days, nozzles, shifts, seed),
+                            batch_size=batch_size, parallel=parallel)
+        for collection, count in loaded.items():
+            counts[collection] += count
+    if rollups:
+        await rebuild_rollups(db)
+    return counts
+
+
+async def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--nozzles", type=int, default=8)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--shifts", type=int, default=1, help="Meter readings per nozzle per day")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day (default: --days ago)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--parallel", type=int, default=4, help="insert_many batches in flight")
+    parser.add_argument("--drop", action="store_true", help="Empty the ledgers and rollups first")
+    parser.add_argument("--no-rollups", action="store_true", help="Skip rebuilding daily_rollups")
+    args = parser.parse_args()
+
+    db = get_database(args.mongo_url, args.db_name)
+    if args.drop:
+        for collection in (*COLLECTIONS, "daily_rollups"):
+            await db[collection].delete_many({})
+
+    print(f"🔧 Generating {args.users} users x {args.nozzles} nozzles x {args.days} days "
+          f"({args.shifts} shift(s)) into {'mongod' if args.mongo_url else 'mongomock'}")
+    started = time.perf_counter()
+    counts = await generate(db, args.users, args.nozzles, args.days, start=args.start, shifts=args.shifts,
+                            seed=args.seed, batch_size=args.batch_size, parallel=args.parallel,
+                            rollups=not args.no_rollups)
+    seconds = time.perf_counter() - started
+    total = sum(counts.values())
+    for collection, count in counts.items():
+        print(f"   {collection:<16} {count:>12,}")
+    print(f"✅ {total:,} documents in {seconds:.1f} s ({total / seconds:,.0f} documents/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
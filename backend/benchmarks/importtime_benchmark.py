@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Cold-start cost of the backend, measured in fresh interpreters: bare
+interpreter start-up, `import server` and `create_app()`, plus the slowest
+modules reported by `python -X importtime`.
+
+    python benchmarks/importtime_benchmark.py [--runs 5] [--top 15] [--json importtime.json]
+
+Compare the JSON output between commits to catch import-time regressions.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from common import BACKEND_DIR
+
+# Prints import and app-construction times in seconds as one JSON line
+COLD_START = """
+import json, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+server.create_app()
+built = time.perf_counter()
+print(json.dumps({"import_s": imported - started, "create_app_s": built - imported}))
+"""
+
+
+def run_python(args: list) -> subprocess.CompletedProcess:
+    # Deliberately unreachable: nothing at import time should connect
+    env = {**os.environ, "MONGO_URL": "mongodb://localhost:1", "DB_NAME": "importtime_benchmark"}
+    return subprocess.run([sys.executable, *args], cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def wall_time(args: list) -> float:
+    started = time.perf_counter()
+    run_python(args)
+    return time.perf_counter() - started
+
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self_us, cumulative_us) rows from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def ms_summary(samples: list) -> dict:
+    return {
+        "min_ms": round(min(samples) * 1000, 1),
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    interpreter = [wall_time(["-c", "pass"]) for _ in range(args.runs)]
+    process = [wall_time(["-c", COLD_START]) for _ in range(args.runs)]
+    phases = [json.loads(run_python(["-c", COLD_START]).stdout) for _ in range(args.runs)]
+
+    rows = parse_importtime(run_python(["-X", "importtime", "-c", "import server"]).stderr)
+    slowest_cumulative = sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]
+    slowest_self = sorted(rows, key=lambda row: row[1], reverse=True)[:args.top]
+
+    results = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "interpreter": ms_summary(interpreter),
+        "process": ms_summary(process),
+        "import_server": ms_summary([phase["import_s"] for phase in phases]),
+        "create_app": ms_summary([phase["create_app_s"] for phase in phases]),
+        "modules_imported": len(rows),
+        "slowest_cumulative": [{"module": m, "self_ms": s / 1000, "cumulative_ms": c / 1000}
+                               for m, s, c in slowest_cumulative],
+        "slowest_self": [{"module": m, "self_ms": s / 1000, "cumulative_ms": c / 1000}
+                         for m, s, c in slowest_self],
+    }
+
+    print(f"🔧 Cold start ({args.runs} runs, Python {results['python']}, median)")
+    for name in ("interpreter", "process", "import_server", "create_app"):
+        print(f"   {name:<14} {results[name]['median_ms']:8.1f} ms")
+    print(f"   {results['modules_imported']} modules imported by `import server`; slowest (cumulative):")
+    for row in results["slowest_cumulative"]:
+        print(f"   {row['cumulative_ms']:8.1f} ms  {row['module']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"📄 Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
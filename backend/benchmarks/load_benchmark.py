@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+API load benchmark: seeds multi-year ledgers for a few users with
+generate_data.py, then drives the auth, list, create, backup and summary
+endpoints through the app in-process with concurrent requests and reports
+p50/p95/p99 latency and throughput per scenario.
+
+    python benchmarks/load_benchmark.py [--mongo-url mongodb://localhost:27017]
+        [--users 3] [--years 2] [--requests 100] [--concurrency 8]
+        [--json results.json] [--baseline previous.json]
+
+With --baseline, scenarios whose p95 grew by more than --tolerance are
+reported as regressions and the exit status is 1.
+
+mongomock scans collections linearly and ignores indexes, so its numbers
+are only comparable with other mongomock runs; use --mongo-url for
+realistic latencies.
+"""
+
+import asyncio
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from common import app_client, base_parser, get_database, summarize
+from generate_data import COLLECTIONS, generate, session_token
+
+import server
+
+async def seed(db, users: int, start: date, days: int, nozzles: int) -> dict:
+    for collection in (*COLLECTIONS, "daily_rollups"):
+        await db[collection].delete_many({})
+    return await generate(db, users, nozzles, days, start=start)
+
+
+async def run_scenario(request, requests: int, concurrency: int) -> dict:
+    """Issue ``requests`` calls of request(i) from ``concurrency`` workers"""
+    samples, errors = [], 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in pending:
+            started = time.perf_counter()
+            response = await request(i)
+            samples.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {**summarize(samples), "errors": errors, "throughput_rps": len(samples) / elapsed}
+
+
+def scenarios(client, users: int, start: date, days: int) -> dict:
+    def auth(i):
+        return {"Authorization": f"Bearer {session_token(i % users)}"}
+
+    def month(i):
+        first = start + timedelta(days=(i * 31) % days)
+        return first.isoformat(), (first + timedelta(days=30)).isoformat()
+
+    async def auth_cached(i):
+        return await client.get("/auth/me", headers=auth(i))
+
+    async def auth_uncached(i):
+        server.session_cache.clear()
+        return await client.get("/auth/me", headers=auth(i))
+
+    async def list_month(i):
+        date_from, date_to = month(i)
+        return await client.get("/fuel-sales", headers=auth(i), params={"from": date_from, "to": date_to})
+
+    async def create(i):
+        return await client.post("/credit-sales", headers=auth(i), json={
+            "date": (start + timedelta(days=days - 1)).isoformat(), "customer_name": "Load test", "amount": 100.0
+        })
+
+    async def backup(i):
+        return await client.post("/sync/backup", headers=auth(i))
+
+    def summary(source):
+        async def run(i):
+            return await client.get("/summary", headers=auth(i), params={"period": "month", "source": source})
+        return run
+
+    return {
+        "auth_cached": (auth_cached, 1),
+        "auth_uncached": (auth_uncached, 1),
+        "list_month": (list_month, 1),
+        "create": (create, 1),
+        # Whole-history aggregations and payloads: a tenth of the requests
+        "summary_rollups": (summary("rollups"), 10),
+        "summary_raw": (summary("raw"), 10),
+        "backup": (backup, 10),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+    return regressions
+
+
+async def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--nozzles", type=int, default=6)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scenario", action="append", help="Only run these scenarios (repeatable)")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare p95 latencies with an earlier --json file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 growth over the baseline")
+    args = parser.parse_args()
+
+    days = int(args.years * 365)
+    start = date.today() - timedelta(days=days)
+    db = get_database(args.mongo_url, args.db_name)
+
+    seed_started = time.perf_counter()
+    counts = await seed(db, args.users, start, days, args.nozzles)
+    seed_seconds = time.perf_counter() - seed_started
+    print(f"🔧 Load benchmark ({'mongod' if args.mongo_url else 'mongomock'}, {args.users} users x {days} days "
+          f"x {args.nozzles} nozzles, concurrency {args.concurrency})")
+    print(f"   seeded {counts} in {seed_seconds:.1f} s")
+
+    results = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "database": "mongod" if args.mongo_url else "mongomock",
+        "python": sys.version.split()[0],
+        "config": {"users": args.users, "days": days, "nozzles": args.nozzles,
+                   "requests": args.requests, "concurrency": args.concurrency},
+        "seeded": counts,
+        "scenarios": {},
+    }
+
+    async with app_client(db, session_token(0)) as client:
+        for name, (request, divisor) in scenarios(client, args.users, start, days).items():
+            if args.scenario and name not in args.scenario:
+                continue
+            stats = await run_scenario(request, max(args.requests // divisor, 5), args.concurrency)
+            results["scenarios"][name] = stats
+            print(f"   {name:<16} p50 {stats['p50_ms']:8.2f}  p95 {stats['p95_ms']:8.2f}  "
+                  f"p99 {stats['p99_ms']:8.2f} ms  {stats['throughput_rps']:8.1f} req/s"
+                  f"{'  ' + str(stats['errors']) + ' errors' if stats['errors'] else ''}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"📄 Wrote {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"❌ Regression {regression}")
+        if regressions:
+            return 1
+        print("✅ No p95 regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
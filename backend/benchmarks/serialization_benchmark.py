@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Response serialization cost for list payloads: FastAPI's default path
+(jsonable_encoder + stdlib json, as JSONResponse renders) versus
+FastJSONResponse (orjson, no encoder walk).
+
+    python benchmarks/serialization_benchmark.py [--records 10000]
+"""
+
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+import common  # noqa: F401  (puts the backend on sys.path)
+from responses import FastJSONResponse
+
+
+def fuel_sales(count: int) -> list:
+    """Documents shaped like fuel_sales rows as read from MongoDB (naive UTC datetimes)"""
+    start = datetime(2023, 1, 1)
+    records = []
+    for i in range(count):
+        created = start + timedelta(minutes=i * 40)
+        opening = 10000.0 + i * 47.5
+        records.append({
+            "id": str(uuid.uuid4()),
+            "user_id": "bench-user",
+            "date": created.date().isoformat(),
+            "fuel_type": "Petrol" if i % 3 else "Diesel",
+            "nozzle_id": f"N{i % 12 + 1}",
+            "opening_reading": opening,
+            "closing_reading": opening + 47.5,
+            "liters": 47.5,
+            "rate": 102.5,
+            "amount": 4868.75,
+            "created_at": created,
+            "updated_at": created,
+            "version": 1,
+            "deleted": False,
+            "deleted_at": None,
+        })
+    return records
+
+
+def default_path(content):
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def fast_path(content):
+    return FastJSONResponse(content).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    content = {"items": fuel_sales(args.records), "next_cursor": None}
+
+    # Both renderers must agree on the payload
+    assert json.loads(default_path(content)) == json.loads(fast_path(content))
+
+    print(f"🔧 Serialization of {args.records:,} fuel sale records (best of {args.repeat})")
+    for name, render in [("jsonable_encoder + json", default_path), ("FastJSONResponse", fast_path)]:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            body = render(content)
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        per_10k = best * 10000 / args.records * 1000
+        print(f"   {name:<24} {best * 1000:8.1f} ms  ({per_10k:.1f} ms per 10k records, {len(body):,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
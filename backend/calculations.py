@@ -0,0 +1,146 @@
+"""
+Fuel sale calculations: liters and amount derived from nozzle readings,
+and checks that each nozzle's readings carry on from its previous shift.
+
+A shift is computed in one pass over its rows. Rows for the same nozzle
+chain in the order given, and the first row of each nozzle is checked
+against that nozzle's latest stored closing reading.
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+# Readings and amounts are kept to two decimals; client-computed amounts
+# may be off by a rounding step
+READING_TOLERANCE = 0.005
+AMOUNT_TOLERANCE = 0.01
+
+
+def liters_and_amount(opening: float, closing: float, rate: float) -> Tuple[float, float]:
+    liters = round(closing - opening, 2)
+    return liters, round(liters * rate, 2)
+
+
+class InconsistentReadings(ValueError):
+    pass
+
+
+def check_readings(opening: float, closing: float, rate: float, sent: dict) -> Tuple[float, float, List[str]]:
+    """liters and amount for the readings, and errors for a closing reading
+    below the opening one or client-sent liters/amount that disagree.
+
+    A missing or null liters/amount is not an error; it is just computed.
+    """
+    if closing < opening:
+        return None, None, [f"closing_reading {closing} is below opening_reading {opening}"]
+
+    liters, amount = liters_and_amount(opening, closing, rate)
+    errors = []
+    for field, value, tolerance in (("liters", liters, READING_TOLERANCE), ("amount", amount, AMOUNT_TOLERANCE)):
+        if sent.get(field) is None:
+            continue
+        try:
+            mismatch = abs(float(sent[field]) - value) > tolerance
+        except (TypeError, ValueError):
+            errors.append(f"{field} must be a number")
+            continue
+        if mismatch:
+            errors.append(f"{field} {sent[field]} does not match the readings ({value})")
+    return liters, amount, errors
+
+
+def derive_sale_amounts(data: dict) -> dict:
+    """Sale data with liters/amount computed from its readings and rate.
+
+    Raises InconsistentReadings if check_readings finds errors. Data without
+    usable readings is returned as is, for model validation to report.
+    """
+    if not isinstance(data, dict):
+        return data
+    try:
+        opening, closing, rate = (float(data[field]) for field in ("opening_reading", "closing_reading", "rate"))
+    except (KeyError, TypeError, ValueError):
+        return data
+
+    liters, amount, errors = check_readings(opening, closing, rate, data)
+    if errors:
+        raise InconsistentReadings("; ".join(errors))
+    return {**data, "liters": liters, "amount": amount}
+
+
+def compute_shift(rows: List[dict], previous_closings: Dict[str, float],
+                  next_openings: Optional[Dict[str, float]] = None) -> Tuple[List[dict], List[dict]]:
+    """Derive liters and amount for a shift's rows.
+
+    ``previous_closings`` maps nozzle_id to its latest stored closing
+    reading on or before the shift date, ``next_openings`` to the opening
+    reading of its earliest stored reading after it (a backdated shift must
+    close where that one opens). A row may omit opening_reading, in which
+    case it continues from the previous closing. Returns (computed rows,
+    errors); each error names the row index.
+    """
+    computed, errors = [], []
+    expected = dict(previous_closings)
+    last_rows = {}
+
+    for index, row in enumerate(rows):
+        nozzle_id = row["nozzle_id"]
+        previous = expected.get(nozzle_id)
+        opening = row.get("opening_reading")
+        closing = row["closing_reading"]
+
+        if opening is None:
+            if previous is None:
+                errors.append({"index": index, "nozzle_id": nozzle_id,
+                               "error": "opening_reading is required: the nozzle has no previous reading"})
+                continue
+            opening = previous
+        elif previous is not None and abs(opening - previous) > READING_TOLERANCE:
+            errors.append({"index": index, "nozzle_id": nozzle_id,
+                           "error": f"opening_reading {opening} does not match the previous "
+                                    f"closing_reading {previous}"})
+        liters, amount, row_errors = check_readings(opening, closing, row["rate"], row)
+        errors.extend({"index": index, "nozzle_id": nozzle_id, "error": error} for error in row_errors)
+        if liters is None:
+            continue
+
+        expected[nozzle_id] = closing
+        last_rows[nozzle_id] = index
+        computed.append({**row, "opening_reading": opening, "liters": liters, "amount": amount})
+
+    for nozzle_id, following in (next_openings or {}).items():
+        if nozzle_id in last_rows and abs(expected[nozzle_id] - following) > READING_TOLERANCE:
+            errors.append({"index": last_rows[nozzle_id], "nozzle_id": nozzle_id,
+                           "error": f"closing_reading {expected[nozzle_id]} does not match the next stored "
+                                    f"opening_reading {following}"})
+
+    return computed, errors
+
+
+async def neighbouring_readings(repository, user_id: str, nozzle_ids: List[str],
+                                date: str) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Per nozzle, the latest live closing reading on or before ``date`` and
+    the opening reading of the earliest live reading after it.
+
+    Two find_one per nozzle, each a single seek on the
+    (user_id, nozzle_id, date, closing_reading) index, run concurrently.
+    Meters only move forward, so within a date the closing reading orders
+    the rows; created_at cannot order rows inserted by the same batch.
+    """
+    def seek(nozzle_id: str, dates: dict, direction: int, field: str):
+        return repository.collection.find_one(
+            {"user_id": user_id, "nozzle_id": nozzle_id, "date": dates, "deleted": {"$ne": True}},
+            {"_id": 0, field: 1},
+            sort=[("date", direction), ("closing_reading", direction)]
+        )
+
+    async with repository.timed("neighbouring_readings"):
+        found = await asyncio.gather(
+            *(seek(nozzle_id, {"$lte": date}, -1, "closing_reading") for nozzle_id in nozzle_ids),
+            *(seek(nozzle_id, {"$gt": date}, 1, "opening_reading") for nozzle_id in nozzle_ids),
+        )
+    previous, following = found[:len(nozzle_ids)], found[len(nozzle_ids):]
+    return (
+        {nozzle_id: document["closing_reading"] for nozzle_id, document in zip(nozzle_ids, previous) if document},
+        {nozzle_id: document["opening_reading"] for nozzle_id, document in zip(nozzle_ids, following) if document},
+    )
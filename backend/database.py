@@ -0,0 +1,67 @@
+"""
+MongoDB client construction and connection-pool warm-up.
+
+Pool settings come from the environment:
+
+    MONGO_MAX_POOL_SIZE      maxPoolSize (default 100, the driver default)
+    MONGO_MIN_POOL_SIZE      minPoolSize (default 0); also the number of
+                             connections opened by the startup warm-up
+    MONGO_MAX_IDLE_TIME_MS   maxIdleTimeMS (unset: idle connections are kept)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+logger = logging.getLogger(__name__)
+
+WARMUP_RETRY_SECONDS = float(os.environ.get('MONGO_WARMUP_RETRY_SECONDS', '2'))
+WARMUP_MAX_RETRY_SECONDS = 30.0
+
+
+def pool_options() -> dict:
+    options = {
+        "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+        "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', '0')),
+    }
+    max_idle_time_ms = os.environ.get('MONGO_MAX_IDLE_TIME_MS')
+    if max_idle_time_ms:
+        options["maxIdleTimeMS"] = int(max_idle_time_ms)
+    return options
+
+
+def create_client(mongo_url: str, event_listeners: Optional[list] = None) -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(mongo_url, event_listeners=event_listeners or [], **pool_options())
+
+
+async def warm_up(client, connections: Optional[int] = None) -> float:
+    """Ping the server and open up to ``connections`` pooled connections.
+
+    Concurrent pings each need a connection of their own, so the driver
+    opens them now instead of on the first requests; minPoolSize then keeps
+    them open. Returns the time taken in seconds.
+    """
+    if connections is None:
+        connections = pool_options()["minPoolSize"]
+
+    started = time.perf_counter()
+    await client.admin.command("ping")
+    if connections > 1:
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(connections)))
+    return time.perf_counter() - started
+
+
+async def warm_up_until_ready(client, connections: Optional[int] = None) -> float:
+    """Retry warm_up with backoff until the server answers"""
+    delay = WARMUP_RETRY_SECONDS
+    while True:
+        try:
+            return await warm_up(client, connections)
+        except Exception as e:
+            logger.warning(f"MongoDB warm-up failed, retrying in {delay:g}s: {str(e)}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARMUP_MAX_RETRY_SECONDS)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Index management for the MongoDB collections used by the API.
+
+Runs at server startup, or from the command line:
+
+    python indexes.py            # create any missing indexes
+    python indexes.py --check    # only report drift, exit 1 if any
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+LEDGER_COLLECTIONS = ["fuel_sales", "credit_sales", "income_expenses", "fuel_rates"]
+
+# Expected indexes per collection. Index names are part of the contract:
+# drift is detected by name, so change the name when changing the keys.
+EXPECTED_INDEXES = {
+    **{
+        collection: [
+            # Serves (user_id, date) lookups and the keyset order of listings
+            IndexModel(
+                [("user_id", ASCENDING), ("date", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)],
+                name="user_id_date_created_at_id",
+            ),
+            # Delta sync: records changed since a watermark, in (updated_at, id) pages
+            IndexModel([("user_id", ASCENDING), ("updated_at", ASCENDING), ("id", ASCENDING)],
+                       name="user_id_updated_at_id"),
+            # Sync upserts and deletes by id; unique so two pushes of the same
+            # new record (e.g. a retry after a timeout) can't both insert it
+            IndexModel([("user_id", ASCENDING), ("id", ASCENDING)], name="user_id_id_unique", unique=True),
+        ]
+        for collection in LEDGER_COLLECTIONS
+    },
+    "daily_rollups": [
+        # Upsert key of a rollup; its (user_id, date) prefix serves summary reads
+        IndexModel(
+            [("user_id", ASCENDING), ("date", ASCENDING), ("ledger", ASCENDING),
+             ("fuel_type", ASCENDING), ("nozzle_id", ASCENDING), ("type", ASCENDING)],
+            name="rollup_key_unique",
+            unique=True,
+        ),
+    ],
+    "status_checks": [
+        IndexModel([("timestamp", ASCENDING), ("id", ASCENDING)], name="timestamp_id"),
+    ],
+    "user_sessions": [
+        IndexModel([("session_token", ASCENDING)], name="session_token_unique", unique=True),
+        # Expired sessions are removed by MongoDB's TTL monitor
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+    ],
+}
+
+# Latest reading of a nozzle, for the opening = previous closing check
+EXPECTED_INDEXES["fuel_sales"].append(IndexModel(
+    [("user_id", ASCENDING), ("nozzle_id", ASCENDING), ("date", ASCENDING), ("closing_reading", ASCENDING)],
+    name="user_id_nozzle_id_date_closing_reading",
+))
+
+# One rate per user, fuel type and date (the natural key fuel rates are
+# upserted by); also serves the latest rate of a fuel type on or before a date
+EXPECTED_INDEXES["fuel_rates"].append(IndexModel(
+    [("user_id", ASCENDING), ("fuel_type", ASCENDING), ("date", ASCENDING)],
+    name="user_id_fuel_type_date_unique",
+    unique=True,
+))
+
+# Migrations (see migrations.py) removing the duplicates that make a
+# unique index build fail
+UNIQUE_INDEX_MIGRATIONS = {
+    "user_id_fuel_type_date_unique": "dedupe-fuel-rates",
+}
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Index options compared when checking for drift
+COMPARED_OPTIONS = ("unique", "expireAfterSeconds", "sparse", "partialFilterExpression")
+
+PROGRESS_POLL_SECONDS = 2.0
+
+
+def _spec(index: IndexModel) -> dict:
+    document = dict(index.document)
+    document["key"] = list(document["key"].items())
+    return document
+
+
+def _differences(expected: dict, actual: dict) -> list:
+    differences = []
+    if [tuple(k) for k in expected["key"]] != [tuple(k) for k in actual["key"]]:
+        differences.append(f"key {actual['key']} != {expected['key']}")
+    for option in COMPARED_OPTIONS:
+        if expected.get(option) != actual.get(option):
+            differences.append(f"{option} {actual.get(option)!r} != {expected.get(option)!r}")
+    return differences
+
+
+async def check_indexes(db) -> dict:
+    """Compare existing indexes with EXPECTED_INDEXES.
+
+    Returns {"missing": [...], "changed": [...], "unexpected": [...]} where
+    each entry names the collection and index.
+    """
+    drift = {"missing": [], "changed": [], "unexpected": []}
+    for collection, indexes in EXPECTED_INDEXES.items():
+        existing = await db[collection].index_information()
+        expected = {index.document["name"]: _spec(index) for index in indexes}
+
+        for name, spec in expected.items():
+            if name not in existing:
+                drift["missing"].append({"collection": collection, "index": name})
+                continue
+            differences = _differences(spec, existing[name])
+            if differences:
+                drift["changed"].append({"collection": collection, "index": name, "differences": differences})
+
+        for name in existing:
+            if name != "_id_" and name not in expected:
+                drift["unexpected"].append({"collection": collection, "index": name})
+    return drift
+
+
+async def _report_build_progress(db, collection: str, name: str):
+    """Log progress of an in-flight index build from $currentOp until cancelled"""
+    while True:
+        await asyncio.sleep(PROGRESS_POLL_SECONDS)
+        try:
+            ops = await db.client.admin.aggregate([
+                {"$currentOp": {"allUsers": True}},
+                {"$match": {"command.createIndexes": collection}},
+            ]).to_list(None)
+        except OperationFailure:
+            # Not permitted to read $currentOp; fall back to start/finish logging
+            return
+        for op in ops:
+            progress = op.get("progress")
+            if progress:
+                logger.info(f"Building {collection}.{name}: {progress.get('done')}/{progress.get('total')} "
+                            f"({op.get('msg', '')})")
+
+
+async def ensure_indexes(db) -> dict:
+    """Create any missing indexes. Idempotent.
+
+    Indexes whose options drifted are reported but never dropped, since a
+    rebuild on a large collection should be a deliberate operation.
+    """
+    drift = await check_indexes(db)
+    missing = drift["missing"]
+    created, errors = [], []
+
+    for position, entry in enumerate(missing, start=1):
+        collection, name = entry["collection"], entry["index"]
+        index = next(i for i in EXPECTED_INDEXES[collection] if i.document["name"] == name)
+        logger.info(f"[{position}/{len(missing)}] Creating index {collection}.{name}")
+
+        started = time.perf_counter()
+        progress = asyncio.create_task(_report_build_progress(db, collection, name))
+        try:
+            await db[collection].create_indexes([index])
+        except OperationFailure as e:
+            logger.error(f"Index {collection}.{name} failed: {e}")
+            if e.code == DUPLICATE_KEY_ERROR and name in UNIQUE_INDEX_MIGRATIONS:
+                logger.error(f"{collection} has records sharing a {name} key; run "
+                             f"`python migrations.py {UNIQUE_INDEX_MIGRATIONS[name]}` and build the index again")
+            errors.append({**entry, "error": str(e)})
+            continue
+        finally:
+            progress.cancel()
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"[{position}/{len(missing)}] Created index {collection}.{name} in {elapsed:.2f}s")
+        created.append({**entry, "seconds": round(elapsed, 3)})
+
+    for entry in drift["changed"]:
+        logger.warning(f"Index drift on {entry['collection']}.{entry['index']}: {'; '.join(entry['differences'])}")
+    for entry in drift["unexpected"]:
+        logger.warning(f"Unexpected index {entry['collection']}.{entry['index']}")
+
+    return {"created": created, "errors": errors, "changed": drift["changed"], "unexpected": drift["unexpected"]}
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Create or check MongoDB indexes")
+    parser.add_argument("--check", action="store_true", help="Report drift without creating indexes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    try:
+        if args.check:
+            drift = await check_indexes(db)
+            for kind, entries in drift.items():
+                for entry in entries:
+                    print(f"{kind}: {entry['collection']}.{entry['index']} {'; '.join(entry.get('differences', []))}")
+            return 1 if any(drift.values()) else 0
+
+        report = await ensure_indexes(db)
+        print(f"Created {len(report['created'])} index(es), {len(report['errors'])} error(s), "
+              f"{len(report['changed'])} changed, {len(report['unexpected'])} unexpected")
+        return 1 if report["errors"] else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+One-off data migrations.
+
+    python migrations.py backfill-change-tracking
+    python migrations.py dedupe-fuel-rates
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from pymongo import DeleteMany, UpdateOne
+
+from indexes import LEDGER_COLLECTIONS
+from repository import change_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_change_tracking(db) -> dict:
+    """Give ledger records created before change tracking an updated_at,
+    version and deleted flag. Idempotent.
+
+    updated_at is taken from created_at, so backfilled records sort before
+    anything changed since and delta syncs don't re-send them.
+    """
+    counts = {}
+    for collection in LEDGER_COLLECTIONS:
+        result = await db[collection].update_many(
+            {"updated_at": {"$exists": False}},
+            [{"$set": {"updated_at": "$created_at"}}]
+        )
+        counts[collection] = result.modified_count
+        await db[collection].update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+        await db[collection].update_many({"deleted": {"$exists": False}}, {"$set": {"deleted": False}})
+        logger.info(f"Backfilled change tracking on {result.modified_count} {collection} record(s)")
+    return counts
+
+
+DEDUPE_BATCH_SIZE = 500
+
+
+async def dedupe_fuel_rates(db) -> dict:
+    """Collapse fuel rates sharing (user_id, fuel_type, date) into one record
+    so the unique index can be built. Idempotent.
+
+    The survivor is the most recently changed live record (a tombstone only
+    if all are). The others are removed outright, since tombstones would
+    still hold the key. The survivor gets a new updated_at and version so
+    delta syncs re-send it. Clients still holding a removed id keep it until
+    their next full pull.
+    """
+    pipeline = [
+        # Live records first, then most recently changed. Records from before
+        # change tracking have no deleted or updated_at: they count as live
+        # and as changed when created (as backfill_change_tracking has it),
+        # where sorting on the raw fields would rank their nulls first.
+        {"$addFields": {
+            "_dead": {"$eq": [{"$ifNull": ["$deleted", False]}, True]},
+            "_changed": {"$ifNull": ["$updated_at", "$created_at"]},
+        }},
+        {"$sort": {"_dead": 1, "_changed": -1, "created_at": -1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "fuel_type": "$fuel_type", "date": "$date"},
+            "ids": {"$push": "$id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+
+    groups = removed = 0
+    operations = []
+    async for group in db.fuel_rates.aggregate(pipeline, allowDiskUse=True):
+        survivor, *duplicates = group["ids"]
+        user_id = group["_id"]["user_id"]
+        operations.append(DeleteMany({"user_id": user_id, "id": {"$in": duplicates}}))
+        operations.append(UpdateOne({"user_id": user_id, "id": survivor},
+                                    {"$set": {"updated_at": change_timestamp()}, "$inc": {"version": 1}}))
+        groups += 1
+        removed += len(duplicates)
+        if len(operations) >= DEDUPE_BATCH_SIZE:
+            await db.fuel_rates.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        await db.fuel_rates.bulk_write(operations, ordered=False)
+
+    logger.info(f"Collapsed {groups} duplicated fuel rate key(s), removing {removed} record(s)")
+    return {"groups": groups, "removed": removed}
+
+
+MIGRATIONS = {
+    "backfill-change-tracking": backfill_change_tracking,
+    "dedupe-fuel-rates": dedupe_fuel_rates,
+}
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Run a data migration")
+    parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    try:
+        result = await MIGRATIONS[args.migration](db)
+        print(f"{args.migration}: {result}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""Keyset pagination helpers with opaque cursors"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: list) -> str:
+    """Encode the sort-key values of the last returned document"""
+    payload = [{"$date": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = [
+            datetime.fromisoformat(v["$date"]) if isinstance(v, dict) else v
+            for v in payload
+        ]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor("Malformed cursor")
+    if len(values) != size:
+        raise InvalidCursor("Cursor does not match this listing")
+    return values
+
+
+def keyset_filter(sort_keys: tuple, values: list) -> dict:
+    """Filter for documents strictly after ``values`` in ascending ``sort_keys`` order.
+
+    (a, b, c) > (x, y, z)  <=>  a > x  or  (a = x and b > y)  or  (a = x and b = y and c > z)
+    """
+    clauses = []
+    for position, key in enumerate(sort_keys):
+        clause = {k: values[i] for i, k in enumerate(sort_keys[:position])}
+        clause[key] = {"$gt": values[position]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+async def find_page(collection, query: dict, sort_keys: tuple, cursor: Optional[str] = None,
+                    limit: int = DEFAULT_PAGE_SIZE, projection: Optional[dict] = None,
+                    hint: Optional[str] = None) -> dict:
+    """Return one page of ``query`` ordered by ``sort_keys``.
+
+    Fetches at most ``limit + 1`` documents, so memory per request is bounded
+    by the page size regardless of how many documents match. The projection
+    defaults to everything but ``_id`` and must include the sort keys;
+    ``hint`` optionally names the index to use.
+    """
+    if cursor:
+        query = {"$and": [query, keyset_filter(sort_keys, decode_cursor(cursor, len(sort_keys)))]}
+
+    results = collection.find(query, projection or {"_id": 0}).sort([(key, 1) for key in sort_keys])
+    if hint:
+        results = results.hint(hint)
+    documents = await results.limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor([documents[-1].get(key) for key in sort_keys])
+    return {"items": documents, "next_cursor": next_cursor}
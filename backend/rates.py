@@ -0,0 +1,120 @@
+"""
+Effective fuel rates: the rate in force for a fuel type on a date is the
+latest live rate recorded on or before that date.
+
+Lookups go through a per-user interval cache. A miss runs two seeks on
+the unique (user_id, fuel_type, date) index, one for the latest rate
+on or before the date and one for the next rate after it. Together they
+bound the [effective_from, effective_until) interval that rate covers, so
+later lookups anywhere in the interval are a bisect over the cached
+interval starts. Any write to a user's fuel rates drops their intervals.
+"""
+
+import asyncio
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional
+
+from cache import TTLCache
+
+# Sorts before every ISO date: the start of the interval before a fuel
+# type's first rate
+BEFORE_FIRST_RATE = ""
+
+
+class RateIntervals:
+    """Known rate intervals of one user, per fuel type, ordered by start date"""
+
+    def __init__(self):
+        self._starts: Dict[str, List[str]] = {}
+        self._intervals: Dict[str, List[dict]] = {}
+
+    def find(self, fuel_type: str, date: str) -> Optional[dict]:
+        starts = self._starts.get(fuel_type, [])
+        position = bisect_right(starts, date) - 1
+        if position < 0:
+            return None
+        interval = self._intervals[fuel_type][position]
+        if interval["effective_until"] is not None and date >= interval["effective_until"]:
+            return None
+        return interval
+
+    def add(self, fuel_type: str, interval: dict):
+        starts = self._starts.setdefault(fuel_type, [])
+        intervals = self._intervals.setdefault(fuel_type, [])
+        start = interval["effective_from"] or BEFORE_FIRST_RATE
+        position = bisect_left(starts, start)
+        if position < len(starts) and starts[position] == start:
+            # Filled in by a concurrent lookup
+            return
+        starts.insert(position, start)
+        intervals.insert(position, interval)
+
+
+async def load_interval(repository, user_id: str, fuel_type: str, date: str) -> dict:
+    """Rate in force on ``date`` and the dates it covers, from two index seeks"""
+    query = {"user_id": user_id, "fuel_type": fuel_type, "deleted": {"$ne": True}}
+    async with repository.timed("effective_rate"):
+        current, following = await asyncio.gather(
+            repository.collection.find_one(
+                {**query, "date": {"$lte": date}},
+                {"_id": 0, "id": 1, "date": 1, "rate": 1},
+                sort=[("date", -1)]
+            ),
+            repository.collection.find_one(
+                {**query, "date": {"$gt": date}},
+                {"_id": 0, "date": 1},
+                sort=[("date", 1)]
+            ),
+        )
+    return {
+        "rate": current["rate"] if current else None,
+        "id": current["id"] if current else None,
+        "effective_from": current["date"] if current else None,
+        "effective_until": following["date"] if following else None,
+    }
+
+
+class RateCache:
+    """Per-user rate intervals, each user's entry capped at the cache TTL.
+
+    The TTL bounds how long a rate written through another worker process
+    can go unnoticed; writes through this process invalidate immediately.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0):
+        self.users = TTLCache(max_size=max_size, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    async def lookup(self, repository, user_id: str, fuel_type: str, date: str) -> dict:
+        intervals = self.users.get(user_id)
+        if intervals is None:
+            intervals = RateIntervals()
+            self.users.set(user_id, intervals)
+
+        interval = intervals.find(fuel_type, date)
+        if interval is not None:
+            self.hits += 1
+            return interval
+
+        self.misses += 1
+        interval = await load_interval(repository, user_id, fuel_type, date)
+        # Added to the intervals fetched before the query: if a write
+        # invalidated them meanwhile, the result is dropped with them
+        intervals.add(fuel_type, interval)
+        return interval
+
+    def invalidate(self, user_id: str):
+        self.users.invalidate(user_id)
+
+    def clear(self):
+        self.users.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self.users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
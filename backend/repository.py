@@ -0,0 +1,515 @@
+"""
+Data access for the ledger collections.
+
+One LedgerRepository per collection owns every query the API makes against
+it: listing pages, single and bulk writes, sync upserts, soft deletes,
+delta reads and backup cursors. Writes keep the daily rollups in step, and
+each operation is timed so per-collection query stats live in one place.
+"""
+
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Iterable, List, Optional
+
+from pydantic import ValidationError
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from indexes import DUPLICATE_KEY_ERROR
+from pagination import DEFAULT_PAGE_SIZE, find_page, keyset_filter
+from rollups import apply_rollups
+
+logger = logging.getLogger(__name__)
+
+# Keyset order for ledger listings; matches the (user_id, date, created_at, id) index
+LEDGER_SORT_KEYS = ("date", "created_at", "id")
+
+# Indexes (see indexes.EXPECTED_INDEXES) serving each query shape
+LISTING_INDEX = "user_id_date_created_at_id"
+CHANGES_INDEX = "user_id_updated_at_id"
+
+# Order of delta sync pulls; matches CHANGES_INDEX
+CHANGES_SORT_KEYS = ("updated_at", "id")
+
+# Hinting pins the plan, but a hint naming an index that hasn't been built
+# yet fails the query, so it is opt-in
+USE_INDEX_HINTS = os.environ.get('MONGO_INDEX_HINTS', 'false').lower() == 'true'
+
+# Fields the server maintains on ledger records; ignored when sent by clients
+# (a version sent with a sync push is read as the version it was edited from)
+SERVER_MANAGED_FIELDS = {"user_id", "updated_at", "version", "deleted_at"}
+
+# Fields clients set only through sync pushes: a created record is live
+SYNC_ONLY_FIELDS = {"deleted"}
+
+_last_change_timestamp = datetime.min.replace(tzinfo=timezone.utc)
+
+
+class UnknownFields(ValueError):
+    pass
+
+
+def change_timestamp() -> datetime:
+    """Strictly increasing (within this process) updated_at value.
+
+    Millisecond precision, since that is what MongoDB stores; two writes in
+    the same millisecond get consecutive milliseconds.
+    """
+    global _last_change_timestamp
+    now = datetime.now(timezone.utc)
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    if now <= _last_change_timestamp:
+        now = _last_change_timestamp + timedelta(milliseconds=1)
+    _last_change_timestamp = now
+    return now
+
+
+def client_fields(data: dict) -> dict:
+    return {k: v for k, v in data.items() if k not in SERVER_MANAGED_FIELDS}
+
+
+def live_records(user_id: str) -> dict:
+    return {"user_id": user_id, "deleted": {"$ne": True}}
+
+
+class LedgerRepository:
+    """Queries and writes for one ledger collection.
+
+    ``get_db`` is called on every operation rather than captured once, so
+    the repository follows whatever database the app is currently using.
+
+    ``natural_key`` names fields that identify a record per user besides its
+    id (backed by a unique index). Such a ledger is written with save and
+    save_many, and sync upserts fold new records into the one holding their
+    key.
+    """
+
+    def __init__(self, name: str, model, get_db: Callable, sort_keys: tuple = LEDGER_SORT_KEYS,
+                 natural_key: Optional[tuple] = None):
+        self.name = name
+        self.model = model
+        self.sort_keys = sort_keys
+        self.natural_key = natural_key
+        self._get_db = get_db
+        self._timings = {}
+
+    @property
+    def db(self):
+        return self._get_db()
+
+    @property
+    def collection(self):
+        return self.db[self.name]
+
+    @asynccontextmanager
+    async def timed(self, operation: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            timing = self._timings.setdefault(operation, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            timing["count"] += 1
+            timing["total_ms"] += elapsed_ms
+            timing["max_ms"] = max(timing["max_ms"], elapsed_ms)
+            logger.debug(f"{self.name}.{operation} took {elapsed_ms:.2f} ms")
+
+    def stats(self) -> dict:
+        """Call count and mean/max latency per operation"""
+        return {
+            operation: {
+                "count": timing["count"],
+                "mean_ms": round(timing["total_ms"] / timing["count"], 3),
+                "max_ms": round(timing["max_ms"], 3),
+            }
+            for operation, timing in self._timings.items()
+        }
+
+    def hint(self, index: str) -> Optional[str]:
+        return index if USE_INDEX_HINTS else None
+
+    def projection(self, fields: Optional[Iterable[str]] = None) -> dict:
+        """Projection for a field selection; never fetches _id.
+
+        The keyset fields are always included since the next cursor is built
+        from them.
+        """
+        projection = {"_id": 0}
+        if not fields:
+            return projection
+
+        fields = list(fields)
+        unknown = [field for field in fields if field not in self.model.model_fields]
+        if unknown:
+            raise UnknownFields(f"Unknown fields: {', '.join(unknown)}")
+        for field in (*self.sort_keys, *fields):
+            projection[field] = 1
+        return projection
+
+    def build(self, user_id: str, data: dict, sync: bool = False) -> dict:
+        """Validate client data into a new record; raises ValidationError/TypeError.
+
+        SYNC_ONLY_FIELDS are dropped unless the data comes from a sync push.
+        """
+        fields = client_fields(data)
+        if not sync:
+            fields = {k: v for k, v in fields.items() if k not in SYNC_ONLY_FIELDS}
+        return self.model(user_id=user_id, **fields).dict()
+
+    def key_of(self, document: dict) -> tuple:
+        return tuple(document.get(field) for field in self.natural_key)
+
+    def key_filter(self, document: dict) -> dict:
+        return {"user_id": document["user_id"], **{field: document.get(field) for field in self.natural_key}}
+
+    def key_update(self, document: dict) -> dict:
+        """Upsert of a record by natural key: a stored record keeps its id and
+        created_at, gets a new version and is live again"""
+        fields = {k: v for k, v in document.items() if k not in ("id", "created_at", "version")}
+        return {
+            "$set": fields,
+            "$setOnInsert": {"id": document["id"], "created_at": document["created_at"]},
+            "$inc": {"version": 1},
+        }
+
+    async def find_page(self, query: dict, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+                        fields: Optional[Iterable[str]] = None) -> dict:
+        """One keyset page of ``query``; raises InvalidCursor/UnknownFields"""
+        projection = self.projection(fields)
+        async with self.timed("find_page"):
+            return await find_page(self.collection, query, self.sort_keys, cursor=cursor, limit=limit,
+                                   projection=projection, hint=self.hint(LISTING_INDEX))
+
+    async def insert(self, user_id: str, data: dict) -> dict:
+        document = self.build(user_id, data)
+        async with self.timed("insert"):
+            await self.collection.insert_one(document)
+            await apply_rollups(self.db, self.name, [document])
+        return document
+
+    async def insert_many(self, user_id: str, items: List[dict]) -> dict:
+        """Validate items and insert the valid ones with a single insert_many.
+
+        Returns a per-item result so clients can retry just the failures.
+        """
+        results = [None] * len(items)
+        documents, positions = [], []
+        for index, item in enumerate(items):
+            try:
+                document = self.build(user_id, item)
+            except (ValidationError, TypeError) as e:
+                results[index] = {"index": index, "status": "error", "error": str(e)}
+                continue
+            documents.append(document)
+            positions.append(index)
+
+        failed_documents = set()
+        async with self.timed("insert_many"):
+            if documents:
+                try:
+                    await self.collection.insert_many(documents, ordered=False)
+                except BulkWriteError as e:
+                    for error in e.details.get("writeErrors", []):
+                        failed_documents.add(error["index"])
+                        results[positions[error["index"]]] = {
+                            "index": positions[error["index"]],
+                            "status": "error",
+                            "error": error.get("errmsg", "write failed")
+                        }
+
+            inserted = []
+            for i, document in enumerate(documents):
+                if i not in failed_documents:
+                    inserted.append(document)
+                    results[positions[i]] = {"index": positions[i], "status": "created", "id": document["id"]}
+            await apply_rollups(self.db, self.name, inserted)
+
+        return {
+            "inserted": len(inserted),
+            "failed": len(items) - len(inserted),
+            "results": results
+        }
+
+    async def save(self, user_id: str, data: dict) -> tuple:
+        """Insert a record, or update the one holding its natural key.
+
+        Returns (stored record, created).
+        """
+        document = self.build(user_id, data)
+        async with self.timed("save"):
+            current = await self.collection.find_one_and_update(
+                self.key_filter(document), self.key_update(document), projection={"_id": 0},
+                upsert=True, return_document=ReturnDocument.BEFORE
+            )
+            if current:
+                document.update(id=current["id"], created_at=current["created_at"],
+                                version=current.get("version", 1) + 1)
+                await apply_rollups(self.db, self.name, [current], sign=-1)
+            await apply_rollups(self.db, self.name, [document])
+        return document, current is None
+
+    async def save_many(self, user_id: str, items: List[dict]) -> dict:
+        """save for many items with one bulk_write of upserts.
+
+        Items sharing a natural key collapse into one write; the last one wins.
+        """
+        results = [None] * len(items)
+        latest = {}  # natural key -> (item positions, document)
+        for index, item in enumerate(items):
+            try:
+                document = self.build(user_id, item)
+            except (ValidationError, TypeError) as e:
+                results[index] = {"index": index, "status": "error", "error": str(e)}
+                continue
+            positions, _ = latest.get(self.key_of(document), ([], None))
+            latest[self.key_of(document)] = (positions + [index], document)
+
+        keys = list(latest)
+        failed = set()
+        replaced, written = [], []
+        async with self.timed("save_many"):
+            if keys:
+                existing = {
+                    self.key_of(record): record
+                    async for record in self.collection.find(
+                        {"user_id": user_id, "$or": [self.key_filter(latest[key][1]) for key in keys]}, {"_id": 0}
+                    )
+                }
+                try:
+                    await self.collection.bulk_write(
+                        [UpdateOne(self.key_filter(latest[key][1]), self.key_update(latest[key][1]), upsert=True)
+                         for key in keys],
+                        ordered=False
+                    )
+                except BulkWriteError as e:
+                    for error in e.details.get("writeErrors", []):
+                        failed.add(keys[error["index"]])
+                        for position in latest[keys[error["index"]]][0]:
+                            results[position] = {"index": position, "status": "error",
+                                                 "error": error.get("errmsg", "write failed")}
+
+            for key in keys:
+                if key in failed:
+                    continue
+                positions, document = latest[key]
+                current = existing.get(key)
+                if current:
+                    document.update(id=current["id"], created_at=current["created_at"],
+                                    version=current.get("version", 1) + 1)
+                    replaced.append(current)
+                written.append(document)
+                for position in positions:
+                    results[position] = {"index": position, "status": "updated" if current else "created",
+                                         "id": document["id"]}
+            await apply_rollups(self.db, self.name, replaced, sign=-1)
+            await apply_rollups(self.db, self.name, written)
+
+        return {
+            "inserted": len(written) - len(replaced),
+            "updated": len(replaced),
+            "failed": sum(1 for result in results if result["status"] == "error"),
+            "results": results
+        }
+
+    async def merge_natural_keys(self, user_id: str, incoming: dict, existing: dict, superseded: dict) -> dict:
+        """Fold new sync records into the record already holding their natural key.
+
+        A record whose id isn't stored but whose key is (by a stored record,
+        tombstones included, or an earlier record of the batch) takes that
+        record's id; the later one wins and the earlier batch item is added
+        to ``superseded``. Updates ``incoming``, ``existing`` and
+        ``superseded`` in place and returns {item position: client id} for
+        the records that were given another id.
+        """
+        new = [document for _, document in incoming.values() if document["id"] not in existing]
+        if not new:
+            return {}
+
+        owners = {}
+        async for record in self.collection.find(
+            {"user_id": user_id, "$or": [self.key_filter(document) for document in new]}, {"_id": 0}
+        ):
+            owners[self.key_of(record)] = record["id"]
+            existing.setdefault(record["id"], record)
+        for record_id, (_, document) in incoming.items():
+            if record_id in existing:
+                owners.setdefault(self.key_of(document), record_id)
+
+        renamed = {}
+        for document in new:
+            client_id = document["id"]
+            owner = owners.setdefault(self.key_of(document), client_id)
+            if owner != client_id:
+                index, _ = incoming.pop(client_id)
+                document["id"] = owner
+                if owner in incoming:
+                    earlier = incoming[owner][0]
+                    superseded[earlier] = (index, renamed.pop(earlier, owner))
+                incoming[owner] = (index, document)
+                renamed[index] = client_id
+        return renamed
+
+    async def upsert_many(self, user_id: str, items: List[dict]) -> list:
+        """Upsert client records by id; unchanged records are not rewritten.
+
+        Each item carries the version of the stored record it was edited
+        from (none for a new record). It is applied only if that is still
+        the stored version; otherwise it is reported as a conflict with the
+        stored record as ``server``, so a delayed replay can't overwrite a
+        newer edit or revive a record another device deleted. Resending a
+        stored record unchanged is reported unchanged whatever its version.
+
+        A record sent with deleted: true becomes a tombstone. With a natural
+        key, see merge_natural_keys; results then carry the client's id as
+        client_id. When items share an id the last one is written and the
+        earlier ones are reported as superseded by it.
+        """
+        results = [None] * len(items)
+        incoming = {}
+        base_versions = {}  # item position -> version the client edited
+        superseded = {}  # item position -> (position of the item written instead, client id)
+        for index, item in enumerate(items):
+            try:
+                document = self.build(user_id, item, sync=True)
+            except (ValidationError, TypeError) as e:
+                results[index] = {"index": index, "status": "error", "error": str(e)}
+                continue
+            if document["id"] in incoming:
+                superseded[incoming[document["id"]][0]] = (index, document["id"])
+            incoming[document["id"]] = (index, document)
+            base_versions[index] = item.get("version")
+
+        async with self.timed("upsert_many"):
+            existing = {
+                doc["id"]: doc
+                async for doc in self.collection.find(
+                    {"user_id": user_id, "id": {"$in": list(incoming)}}, {"_id": 0}
+                )
+            }
+            renamed = {}
+            if self.natural_key:
+                renamed = await self.merge_natural_keys(user_id, incoming, existing, superseded)
+
+            operations, pending = [], []
+            for record_id, (index, document) in incoming.items():
+                current = existing.get(record_id)
+                selector = {"user_id": user_id, "id": record_id}
+                if current:
+                    # Keep the original creation time so listing order is stable
+                    document["created_at"] = current["created_at"]
+                    # A revived record is no longer deleted
+                    document["deleted_at"] = current.get("deleted_at") if document["deleted"] else None
+                    if all(current.get(k) == v for k, v in document.items() if k not in SERVER_MANAGED_FIELDS):
+                        results[index] = {"index": index, "status": "unchanged", "id": record_id}
+                        continue
+                    if base_versions[index] != current.get("version", 1):
+                        results[index] = {"index": index, "status": "conflict", "id": record_id, "server": current}
+                        continue
+                    document["version"] = current.get("version", 1) + 1
+                    # Only replaces the version read above: if another write
+                    # got in first, the upsert hits the unique id index
+                    selector["version"] = current.get("version")
+
+                document["updated_at"] = change_timestamp()
+                if document["deleted"] and not document["deleted_at"]:
+                    document["deleted_at"] = document["updated_at"]
+                operations.append(ReplaceOne(selector, document, upsert=True))
+                pending.append((index, document, current))
+                results[index] = {"index": index, "status": "applied", "id": record_id,
+                                  "version": document["version"]}
+
+            failed = set()
+            if operations:
+                try:
+                    await self.collection.bulk_write(operations, ordered=False)
+                except BulkWriteError as e:
+                    errors = e.details.get("writeErrors", [])
+                    # Duplicate ids are writes that raced another push: a new
+                    # record inserted meanwhile, or a stored one changed since
+                    # it was read. Other duplicate keys are e.g. an update
+                    # moving a record onto a natural key another record holds.
+                    raced_ids = [pending[error["index"]][1]["id"] for error in errors
+                                 if error.get("code") == DUPLICATE_KEY_ERROR]
+                    stored = {}
+                    if raced_ids:
+                        stored = {
+                            doc["id"]: doc
+                            async for doc in self.collection.find(
+                                {"user_id": user_id, "id": {"$in": raced_ids}}, {"_id": 0}
+                            )
+                        }
+                    for error in errors:
+                        index, document, current = pending[error["index"]]
+                        failed.add(index)
+                        now_stored = stored.get(document["id"])
+                        if now_stored and current is None:
+                            results[index] = {"index": index, "status": "unchanged", "id": document["id"]}
+                        elif now_stored and now_stored.get("version") != current.get("version"):
+                            results[index] = {"index": index, "status": "conflict", "id": document["id"],
+                                              "server": now_stored}
+                        else:
+                            results[index] = {"index": index, "status": "error",
+                                              "error": error.get("errmsg", "write failed")}
+                applied = [entry for entry in pending if entry[0] not in failed]
+                await apply_rollups(self.db, self.name, [current for _, _, current in applied if current], sign=-1)
+                await apply_rollups(self.db, self.name, [document for _, document, _ in applied])
+
+        for index, client_id in renamed.items():
+            results[index]["client_id"] = client_id
+        for index, (winner, client_id) in superseded.items():
+            while winner in superseded:
+                winner = superseded[winner][0]
+            results[index] = {"index": index, "status": "superseded", "id": results[winner].get("id"),
+                              "superseded_by": winner, "client_id": client_id}
+        return results
+
+    async def soft_delete(self, user_id: str, record_id: str) -> Optional[dict]:
+        """Turn a live record into a tombstone so delta syncs can propagate the delete.
+
+        Returns the record as it was before the delete, or None if there was
+        no live record with that id.
+        """
+        query = {**live_records(user_id), "id": record_id}
+        async with self.timed("soft_delete"):
+            current = await self.collection.find_one(query, {"_id": 0})
+            if not current:
+                return None
+
+            now = change_timestamp()
+            result = await self.collection.update_one(
+                query, {"$set": {"deleted": True, "deleted_at": now, "updated_at": now}, "$inc": {"version": 1}}
+            )
+            if result.modified_count:
+                await apply_rollups(self.db, self.name, [current], sign=-1)
+        return current
+
+    async def changed_since(self, user_id: str, since: Optional[datetime] = None, since_id: Optional[str] = None,
+                            limit: int = DEFAULT_PAGE_SIZE) -> list:
+        """Up to ``limit`` records (tombstones included) in (updated_at, id) order,
+        changed at or after ``since``, or strictly after (since, since_id) when
+        since_id is given; from the start if since is None"""
+        query = {"user_id": user_id}
+        if since is not None and since_id is not None:
+            query = {"$and": [query, keyset_filter(CHANGES_SORT_KEYS, [since, since_id])]}
+        elif since is not None:
+            query["updated_at"] = {"$gte": since}
+        async with self.timed("changed_since"):
+            results = self.collection.find(query, {"_id": 0}).sort([(key, 1) for key in CHANGES_SORT_KEYS])
+            hint = self.hint(CHANGES_INDEX)
+            if hint:
+                results = results.hint(hint)
+            return await results.limit(limit).to_list(limit)
+
+    async def fetch_live(self, user_id: str) -> list:
+        """All of a user's live records"""
+        async with self.timed("fetch_live"):
+            return await self.collection.find(live_records(user_id), {"_id": 0}).to_list(None)
+
+    async def iterate_live(self, user_id: str, batch_size: int) -> AsyncIterator[dict]:
+        """Stream a user's live records from a cursor, ``batch_size`` at a time"""
+        async with self.timed("iterate_live"):
+            async for record in self.collection.find(live_records(user_id), {"_id": 0}).batch_size(batch_size):
+                yield record
@@ -0,0 +1,162 @@
+"""
+Per-request timing: wall time, database commands and response size.
+
+RequestStatsMiddleware puts a RequestStats in a context variable for each
+HTTP request, and DatabaseCommandListener (registered on the Motor client)
+adds every MongoDB command to it. Motor runs commands on executor threads
+with a copy of the caller's context, so the listener sees the stats of the
+request that issued the command.
+
+Commands slower than SLOW_QUERY_MS are logged with their collection and
+filter shape (field names and operators, no values).
+"""
+
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '1000'))
+
+# Where each command keeps the filter worth logging
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+}
+
+
+class RequestStats:
+    """Counters for one request; updated from Motor's executor threads"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.db_commands = 0
+        self.db_ms = 0.0
+        self.response_bytes = 0
+        self.status_code = None
+        self._lock = threading.Lock()
+
+    def add_command(self, duration_ms: float):
+        with self._lock:
+            self.db_commands += 1
+            self.db_ms += duration_ms
+
+    @property
+    def wall_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def summary(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status_code,
+            "wall_ms": round(self.wall_ms, 2),
+            "db_commands": self.db_commands,
+            "db_ms": round(self.db_ms, 2),
+            "response_bytes": self.response_bytes,
+        }
+
+
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+def redact(value):
+    """Shape of a filter: operators and field names kept, values replaced by "?" """
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and value and all(isinstance(item, dict) for item in value):
+        # $or/$and clauses and aggregation pipelines
+        return [redact(item) for item in value]
+    return "?"
+
+
+def filter_shape(command_name: str, command: dict):
+    if command_name in FILTER_FIELDS:
+        return redact(command.get(FILTER_FIELDS[command_name], {}))
+    if command_name == "update":
+        return [redact(update.get("q", {})) for update in command.get("updates", [])[:1]]
+    if command_name == "delete":
+        return [redact(delete.get("q", {})) for delete in command.get("deletes", [])[:1]]
+    return None
+
+
+class DatabaseCommandListener(monitoring.CommandListener):
+    """Feeds command durations into the current request's stats and logs slow commands"""
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._pending = {}
+
+    def started(self, event):
+        command_name = event.command_name
+        collection = event.command.get(command_name)
+        self._pending[(event.connection_id, event.request_id)] = (
+            event.database_name, collection, filter_shape(command_name, event.command)
+        )
+
+    def _finished(self, event, failed: bool):
+        database, collection, shape = self._pending.pop((event.connection_id, event.request_id), (None, None, None))
+        duration_ms = event.duration_micros / 1000
+
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.add_command(duration_ms)
+
+        if duration_ms >= self.slow_query_ms:
+            where = f"{database}.{collection}" if isinstance(collection, str) else database
+            request = f" during {stats.method} {stats.path}" if stats is not None else ""
+            logger.warning(f"Slow query{' (failed)' if failed else ''}: {event.command_name} on {where} "
+                           f"took {duration_ms:.1f} ms{request}, filter {shape}")
+
+    def succeeded(self, event):
+        self._finished(event, failed=False)
+
+    def failed(self, event):
+        self._finished(event, failed=True)
+
+
+class RequestStatsMiddleware:
+    """ASGI middleware recording wall time, DB time and response size per request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope["method"], scope["path"])
+        token = current_request_stats.set(stats)
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                stats.status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                stats.response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            current_request_stats.reset(token)
+            summary = stats.summary()
+            summary_line = (f"{summary['method']} {summary['path']} {summary['status']} in {summary['wall_ms']} ms "
+                            f"({summary['db_commands']} DB command(s), {summary['db_ms']} ms in DB, "
+                            f"{summary['response_bytes']} bytes)")
+            if summary["wall_ms"] >= SLOW_REQUEST_MS:
+                logger.warning(f"Slow request: {summary_line}")
+            else:
+                logger.debug(summary_line)
@@ -0,0 +1,30 @@
+"""Fast JSON responses rendered with orjson"""
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+
+def orjson_default(value: Any):
+    """Fallback for types orjson doesn't serialize natively"""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    # datetime and UUID are serialized natively by orjson
+    return orjson.dumps(content, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """Drop-in JSONResponse using orjson.
+
+    It is the app's default response class. Handlers that return large
+    documents construct it directly, which skips FastAPI's jsonable_encoder
+    walk over every record.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Materialized daily rollups of the ledgers, kept in the daily_rollups
+collection.
+
+Each rollup document holds the count and summed measures of one ledger for
+one user, date and dimension key (fuel type and nozzle for fuel sales,
+income/expense type for income_expenses). The write handlers keep them up
+to date with $inc upserts, and they can be recomputed from the raw ledgers:
+
+    python rollups.py rebuild [--user USER_ID]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from indexes import DUPLICATE_KEY_ERROR
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "daily_rollups"
+
+# Dimension fields and summed measures per rolled-up ledger
+ROLLUP_DIMENSIONS = {
+    "fuel_sales": ("fuel_type", "nozzle_id"),
+    "credit_sales": (),
+    "income_expenses": ("type",),
+}
+ROLLUP_MEASURES = {
+    "fuel_sales": ("liters", "amount"),
+    "credit_sales": ("amount",),
+    "income_expenses": ("amount",),
+}
+
+# Every dimension field, as in the unique rollup_key_unique index
+ROLLUP_KEY_FIELDS = ("fuel_type", "nozzle_id", "type")
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def rollup_key(ledger: str, record: dict) -> dict:
+    """Upsert filter of a record's rollup: every field of the unique index,
+    None for dimensions the ledger doesn't have. MongoDB only retries an
+    upsert that lost an insert race when its filter matches the whole index
+    key. (A null filter field also matches rollups stored without it.)"""
+    key = {"user_id": record["user_id"], "date": record["date"][:10], "ledger": ledger}
+    for field in ROLLUP_KEY_FIELDS:
+        key[field] = record.get(field) if field in ROLLUP_DIMENSIONS[ledger] else None
+    return key
+
+
+async def apply_rollups(db, ledger: str, records: list, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) records from the daily rollups.
+
+    Records sharing a rollup key are combined first, so a batch costs one
+    bulk_write with one upsert per distinct key. Soft-deleted records are
+    skipped.
+    """
+    # Tombstones never count towards the totals
+    records = [record for record in records if not record.get("deleted")]
+    if ledger not in ROLLUP_DIMENSIONS or not records:
+        return
+
+    increments = {}
+    for record in records:
+        key = rollup_key(ledger, record)
+        identity = tuple(key.items())
+        if identity not in increments:
+            increments[identity] = {"count": 0, **{m: 0.0 for m in ROLLUP_MEASURES[ledger]}}
+        increments[identity]["count"] += sign
+        for measure in ROLLUP_MEASURES[ledger]:
+            increments[identity][measure] += sign * (record.get(measure) or 0.0)
+
+    operations = [UpdateOne(dict(identity), {"$inc": inc}, upsert=True) for identity, inc in increments.items()]
+    try:
+        await db[ROLLUP_COLLECTION].bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # A concurrent first write of the same key inserted it first; servers
+        # that don't retry such upserts themselves leave it to us
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        await db[ROLLUP_COLLECTION].bulk_write([operations[error["index"]] for error in errors], ordered=False)
+
+    if sign < 0:
+        # Rollups emptied by deletes and edits would otherwise pile up
+        await db[ROLLUP_COLLECTION].delete_many(
+            {"$or": [dict(identity) for identity in increments], "count": {"$lte": 0}}
+        )
+
+
+def rebuild_pipeline(ledger: str, match: dict) -> list:
+    group_id = {"user_id": "$user_id", "date": {"$substr": ["$date", 0, 10]}}
+    for field in ROLLUP_DIMENSIONS[ledger]:
+        group_id[field] = f"${field}"
+
+    group = {"_id": group_id, "count": {"$sum": 1}}
+    for measure in ROLLUP_MEASURES[ledger]:
+        group[measure] = {"$sum": f"${measure}"}
+    return [{"$match": {**match, "deleted": {"$ne": True}}}, {"$group": group}]
+
+
+async def rebuild_rollups(db, user_id: str = None) -> dict:
+    """Recompute rollups from the raw ledgers, for one user or everyone.
+
+    Writes made to the user's ledgers while this runs may be lost from the
+    rollups, so run it when the user is idle (or rerun it afterwards).
+    """
+    match = {"user_id": user_id} if user_id else {}
+    deleted = await db[ROLLUP_COLLECTION].delete_many(match)
+    logger.info(f"Deleted {deleted.deleted_count} rollup document(s)")
+
+    counts = {}
+    for ledger in ROLLUP_DIMENSIONS:
+        counts[ledger] = 0
+        batch = []
+        async for row in db[ledger].aggregate(rebuild_pipeline(ledger, match), allowDiskUse=True):
+            key = row.pop("_id")
+            batch.append({**{field: None for field in ROLLUP_KEY_FIELDS}, **key, "ledger": ledger, **row})
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                await db[ROLLUP_COLLECTION].insert_many(batch, ordered=False)
+                counts[ledger] += len(batch)
+                batch = []
+        if batch:
+            await db[ROLLUP_COLLECTION].insert_many(batch, ordered=False)
+            counts[ledger] += len(batch)
+        logger.info(f"Rebuilt {counts[ledger]} {ledger} rollup document(s)")
+    return counts
+
+
+def rollup_summary_pipeline(match: dict, period_expression, fuel_grouping: str) -> list:
+    return [
+        {"$match": {**match, "ledger": {"$in": list(ROLLUP_DIMENSIONS)}}},
+        {"$group": {
+            "_id": {
+                "period": period_expression,
+                "ledger": "$ledger",
+                "key": fuel_grouping,
+                "type": "$type",
+            },
+            "count": {"$sum": "$count"},
+            "liters": {"$sum": "$liters"},
+            "amount": {"$sum": "$amount"},
+        }},
+        # Groups whose records were all deleted, like the raw summary
+        {"$match": {"count": {"$gt": 0}}},
+    ]
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Maintain the daily_rollups collection")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user", help="Only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    try:
+        counts = await rebuild_rollups(db, args.user)
+        print(f"Rebuilt rollups: {counts}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
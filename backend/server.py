@@ -1,29 +1,114 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, Query
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, model_validator
+from pymongo.errors import DuplicateKeyError
+from typing import Dict, List, Optional
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import date as date_type, datetime, timezone, timedelta
 import httpx
 import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from cache import TTLCache
+from calculations import compute_shift, derive_sale_amounts, neighbouring_readings
+from database import create_client, warm_up_until_ready
+from indexes import ensure_indexes
+from responses import FastJSONResponse, dumps
+from rates import RateCache
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, find_page
+from repository import LedgerRepository, UnknownFields, change_timestamp
+from request_stats import DatabaseCommandListener, RequestStatsMiddleware
+from metrics import BACKUP_PAYLOAD_BYTES, CONTENT_TYPE, REGISTRY, MetricsMiddleware, PoolCheckoutListener
+from summary import FUEL_GROUPINGS, PERIODS, SOURCES, build_summary
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection, created on first use rather than at import time
+client = None
+db = None
+
+def get_client():
+    global client
+    if client is None:
+        client = create_client(
+            os.environ['MONGO_URL'], event_listeners=[DatabaseCommandListener(), PoolCheckoutListener()]
+        )
+    return client
+
+def get_db():
+    """The app's database. Assign server.db to point the app elsewhere (tests, benchmarks)"""
+    global db
+    if db is None:
+        db = get_client()[os.environ['DB_NAME']]
+    return db
+
+def close_client():
+    global client, db
+    if client is not None:
+        client.close()
+    client = db = None
 
-# Create the main app without a prefix
-app = FastAPI()
+# Session token -> User cache so protected routes skip the session/user
+# lookups on repeat requests
+session_cache = TTLCache(
+    max_size=int(os.environ.get('SESSION_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('SESSION_CACHE_TTL', '60')),
+)
+REGISTRY.gauge("auth_session_cache_hit_ratio", "Share of session lookups served from the cache",
+               function=lambda: session_cache.stats()["hit_ratio"])
+REGISTRY.counter("auth_session_cache_hits_total", "Session lookups served from the cache",
+                 function=lambda: session_cache.hits)
+REGISTRY.counter("auth_session_cache_misses_total", "Session lookups that went to the database",
+                 function=lambda: session_cache.misses)
+
+# User -> rate intervals answering /fuel-rates/effective; dropped on every
+# write to the user's fuel rates
+rate_cache = RateCache(
+    max_size=int(os.environ.get('RATE_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('RATE_CACHE_TTL', '300')),
+)
+REGISTRY.counter("fuel_rate_cache_hits_total", "Effective rate lookups served from the cache",
+                 function=lambda: rate_cache.hits)
+REGISTRY.counter("fuel_rate_cache_misses_total", "Effective rate lookups that went to the database",
+                 function=lambda: rate_cache.misses)
+
+# Auth provider endpoint; point it at a local stub server for tests
+AUTH_SESSION_DATA_URL = os.environ.get(
+    'AUTH_SESSION_DATA_URL',
+    'https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data'
+)
+
+def create_http_client() -> httpx.AsyncClient:
+    """Connection-pooled client for outbound calls, configured from the environment"""
+    http2 = os.environ.get('AUTH_HTTP2', 'false').lower() == 'true'
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logging.getLogger(__name__).warning("AUTH_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+            http2 = False
+    
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            float(os.environ.get('AUTH_HTTP_TIMEOUT', '10')),
+            connect=float(os.environ.get('AUTH_HTTP_CONNECT_TIMEOUT', '5'))
+        ),
+        limits=httpx.Limits(
+            max_connections=int(os.environ.get('AUTH_HTTP_MAX_CONNECTIONS', '100')),
+            max_keepalive_connections=int(os.environ.get('AUTH_HTTP_MAX_KEEPALIVE', '20')),
+            keepalive_expiry=float(os.environ.get('AUTH_HTTP_KEEPALIVE_EXPIRY', '60'))
+        ),
+        http2=http2
+    )
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -37,6 +122,10 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+class StatusCheckPage(BaseModel):
+    items: List[StatusCheck]
+    next_cursor: Optional[str] = None
+
 # User Authentication Models
 class User(BaseModel):
     id: str = Field(alias="_id")
@@ -45,9 +134,7 @@ class User(BaseModel):
     picture: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     
-    class Config:
-        populate_by_name = True
-        json_encoders = {datetime: lambda v: v.isoformat()}
+    model_config = ConfigDict(populate_by_name=True)
 
 class UserSession(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -73,6 +160,17 @@ class FuelSale(BaseModel):
     rate: float
     amount: float
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: change_timestamp())
+    version: int = 1
+    deleted: bool = False
+    deleted_at: Optional[datetime] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def derive_amounts(cls, data):
+        """liters and amount always follow from the readings and rate; values
+        sent by clients are only checked against them"""
+        return derive_sale_amounts(data)
 
 class CreditSale(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -82,6 +180,10 @@ class CreditSale(BaseModel):
     amount: float
     description: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: change_timestamp())
+    version: int = 1
+    deleted: bool = False
+    deleted_at: Optional[datetime] = None
 
 class IncomeExpense(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -92,6 +194,10 @@ class IncomeExpense(BaseModel):
     amount: float
     description: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: change_timestamp())
+    version: int = 1
+    deleted: bool = False
+    deleted_at: Optional[datetime] = None
 
 class FuelRate(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -100,6 +206,126 @@ class FuelRate(BaseModel):
     fuel_type: str
     rate: float
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: change_timestamp())
+    version: int = 1
+    deleted: bool = False
+    deleted_at: Optional[datetime] = None
+
+class SyncRequest(BaseModel):
+    since: Optional[datetime] = None  # watermark from the previous sync
+    since_id: Optional[str] = None  # watermark_id from the previous sync, if any
+    changes: Dict[str, List[dict]] = Field(default_factory=dict)
+    limit: int = Field(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)  # records pulled per call
+
+class ShiftReading(BaseModel):
+    nozzle_id: str
+    fuel_type: str
+    closing_reading: float
+    rate: float
+    opening_reading: Optional[float] = None  # defaults to the nozzle's previous closing
+    liters: Optional[float] = None  # checked against the readings when sent
+    amount: Optional[float] = None
+
+class FuelShift(BaseModel):
+    date: str
+    readings: List[ShiftReading]
+
+LEDGER_MODELS = {
+    "fuel_sales": FuelSale,
+    "credit_sales": CreditSale,
+    "income_expenses": IncomeExpense,
+    "fuel_rates": FuelRate,
+}
+
+# Fields identifying a record per user besides its id; backed by unique indexes
+NATURAL_KEYS = {
+    "fuel_rates": ("date", "fuel_type"),
+}
+
+# One repository per ledger; they look up the database on each call
+repositories = {
+    collection: LedgerRepository(collection, model, get_db, natural_key=NATURAL_KEYS.get(collection))
+    for collection, model in LEDGER_MODELS.items()
+}
+
+async def list_page(collection, query: dict, sort_keys: tuple, cursor: Optional[str], limit: int) -> FastJSONResponse:
+    """One page of a listing, turning bad cursors into 400s"""
+    try:
+        page = await find_page(collection, query, sort_keys, cursor=cursor, limit=limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(page)
+
+async def ledger_page(collection: str, query: dict, cursor: Optional[str], limit: int,
+                      fields: Optional[str]) -> FastJSONResponse:
+    """One page of a ledger listing; fields=a,b,c limits the returned fields"""
+    selected = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    try:
+        page = await repositories[collection].find_page(query, cursor=cursor, limit=limit, fields=selected)
+    except (InvalidCursor, UnknownFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(page)
+
+# Most records accepted by one bulk request
+MAX_BULK_ITEMS = 1000
+
+async def bulk_create(collection: str, user_id: str, items: List[dict]) -> dict:
+    """Create many records of a ledger with one write; ledgers with a natural key upsert"""
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ITEMS} items per request")
+    repository = repositories[collection]
+    if repository.natural_key:
+        return await repository.save_many(user_id, items)
+    return await repository.insert_many(user_id, items)
+
+async def create_record(collection: str, user_id: str, data: dict) -> tuple:
+    """Create one record of a ledger; ledgers with a natural key upsert.
+    
+    Returns (stored record, created). Invalid data is a 422 listing the
+    errors, like a request failing FastAPI's own validation.
+    """
+    repository = repositories[collection]
+    try:
+        if repository.natural_key:
+            return await repository.save(user_id, data)
+        return await repository.insert(user_id, data), True
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A record with this id already exists")
+
+def ledger_query(user_id: str, date: Optional[str], date_from: Optional[str], date_to: Optional[str]) -> dict:
+    """Query for a user's live records on one date or within an inclusive date range"""
+    if date and (date_from or date_to):
+        raise HTTPException(status_code=400, detail="Use either date or from/to, not both")
+    for value in (date, date_from, date_to):
+        if value:
+            try:
+                date_type.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+    
+    query = {"user_id": user_id, "deleted": {"$ne": True}}
+    if date:
+        query["date"] = date
+    elif date_from or date_to:
+        # ISO date strings sort chronologically, so this is an index range scan
+        query["date"] = {}
+        if date_from:
+            query["date"]["$gte"] = date_from
+        if date_to:
+            query["date"]["$lte"] = date_to
+    return query
+
+def get_http_client(app: FastAPI) -> httpx.AsyncClient:
+    """Shared outbound HTTP client, so logins reuse pooled connections.
+    
+    Normally created at startup; created on first use when the app runs
+    without lifespan events (e.g. in-process test clients).
+    """
+    if getattr(app.state, "http_client", None) is None:
+        app.state.http_client = create_http_client()
+    return app.state.http_client
 
 # Authentication helper functions
 async def get_session_token(request: Request) -> Optional[str]:
@@ -116,30 +342,52 @@ async def get_session_token(request: Request) -> Optional[str]:
     
     return None
 
+def session_user_pipeline(session_token: str) -> list:
+    """Aggregation joining a valid session to its user document"""
+    return [
+        {"$match": {
+            "session_token": session_token,
+            "expires_at": {"$gt": datetime.now(timezone.utc)}
+        }},
+        {"$limit": 1},
+        {"$lookup": {
+            "from": "users",
+            "localField": "user_id",
+            "foreignField": "_id",
+            "as": "user"
+        }},
+        {"$unwind": "$user"},
+    ]
+
 async def get_current_user(request: Request) -> Optional[User]:
     """Get current authenticated user from session token"""
     session_token = await get_session_token(request)
     if not session_token:
         return None
     
-    # Check if session exists and is valid
-    session = await db.user_sessions.find_one({
-        "session_token": session_token,
-        "expires_at": {"$gt": datetime.now(timezone.utc)}
-    })
+    cached_user = session_cache.get(session_token)
+    if cached_user:
+        return cached_user
     
-    if not session:
+    # Resolve the valid session and its user in a single round trip
+    sessions = await get_db().user_sessions.aggregate(session_user_pipeline(session_token)).to_list(1)
+    if not sessions:
         return None
     
-    # Get user data
-    user_doc = await db.users.find_one({"_id": session["user_id"]})
-    if not user_doc:
-        return None
+    session = sessions[0]
+    user_doc = session["user"]
     
     # Map _id to id for Pydantic compatibility
     user_doc["id"] = user_doc["_id"]
     del user_doc["_id"]  # Remove _id to avoid conflicts
-    return User(**user_doc)
+    user = User(**user_doc)
+    
+    # Cache until the session expires (capped by the cache TTL)
+    expires_at = session["expires_at"]
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    session_cache.set(session_token, user, expires_at=expires_at.timestamp())
+    return user
 
 async def require_auth(request: Request) -> User:
     """Dependency to require authentication"""
@@ -168,16 +416,15 @@ async def create_session(request: Request, response: Response):
             raise HTTPException(status_code=400, detail="Session ID required")
         
         # Call Emergent auth service to get user data
-        async with httpx.AsyncClient() as client:
-            auth_response = await client.get(
-                "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-                headers={"X-Session-ID": session_id}
-            )
-            
-            if auth_response.status_code != 200:
-                raise HTTPException(status_code=400, detail="Invalid session ID")
-            
-            session_data = auth_response.json()
+        auth_response = await get_http_client(request.app).get(
+            AUTH_SESSION_DATA_URL,
+            headers={"X-Session-ID": session_id}
+        )
+        
+        if auth_response.status_code != 200:
+            raise HTTPException(status_code=400, detail="Invalid session ID")
+        
+        session_data = auth_response.json()
         
         # Extract user info
         user_data = {
@@ -189,12 +436,12 @@ async def create_session(request: Request, response: Response):
         }
         
         # Check if user exists, if not create new user
-        existing_user = await db.users.find_one({"_id": user_data["id"]})
+        existing_user = await get_db().users.find_one({"_id": user_data["id"]})
         if not existing_user:
             # Insert new user (use _id as MongoDB field)
             user_doc = user_data.copy()
             user_doc["_id"] = user_doc.pop("id")
-            await db.users.insert_one(user_doc)
+            await get_db().users.insert_one(user_doc)
         
         # Create new session
         session_token = session_data["session_token"]
@@ -206,10 +453,11 @@ async def create_session(request: Request, response: Response):
         }
         
         # Clean up existing sessions for this user
-        await db.user_sessions.delete_many({"user_id": user_data["id"]})
+        await get_db().user_sessions.delete_many({"user_id": user_data["id"]})
+        session_cache.invalidate_where(lambda token, user: user.id == user_data["id"])
         
         # Insert new session
-        await db.user_sessions.insert_one(session_doc)
+        await get_db().user_sessions.insert_one(session_doc)
         
         # Set httpOnly cookie
         response.set_cookie(
@@ -225,6 +473,8 @@ async def create_session(request: Request, response: Response):
         # Return user data
         return {"user": user_data, "session_token": session_token}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Session creation error: {str(e)}")
         raise HTTPException(status_code=500, detail="Session creation failed")
@@ -235,7 +485,8 @@ async def logout(request: Request, response: Response):
     session_token = await get_session_token(request)
     if session_token:
         # Delete session from database
-        await db.user_sessions.delete_many({"session_token": session_token})
+        await get_db().user_sessions.delete_many({"session_token": session_token})
+        session_cache.invalidate(session_token)
     
     # Clear cookie
     response.delete_cookie(
@@ -247,6 +498,33 @@ async def logout(request: Request, response: Response):
     
     return {"message": "Logged out successfully"}
 
+@api_router.get("/auth/cache-stats")
+async def get_auth_cache_stats():
+    """Session cache hit/miss counters"""
+    return session_cache.stats()
+
+@api_router.get("/health")
+async def health():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@api_router.get("/ready")
+async def ready(request: Request):
+    """Readiness: 503 until the MongoDB connection pool has been warmed up"""
+    if not getattr(request.app.state, "ready", False):
+        return FastJSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready"}
+
+@api_router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of the app's metrics"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@api_router.get("/db/query-stats")
+async def get_query_stats():
+    """Per-ledger query counts and latencies since startup"""
+    return {collection: repository.stats() for collection, repository in repositories.items()}
+
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
 async def root():
@@ -256,130 +534,356 @@ async def root():
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    _ = await get_db().status_checks.insert_one(status_obj.dict())
     return status_obj
 
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+@api_router.get("/status", response_model=StatusCheckPage)
+async def get_status_checks(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    return await list_page(get_db().status_checks, {}, ("timestamp", "id"), cursor, limit)
 
 # Petrol Pump Data Routes (Protected)
 @api_router.get("/fuel-sales")
-async def get_fuel_sales(request: Request, date: Optional[str] = None):
-    """Get fuel sales for a specific date"""
-    user = await require_auth(request)
+async def get_fuel_sales(
+    request: Request,
+    date: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None
+):
+    """Get a page of fuel sales, optionally for a date or from/to range.
     
-    query = {"user_id": user.id}
-    if date:
-        query["date"] = date
-    
-    sales = await db.fuel_sales.find(query).to_list(1000)
-    # Remove MongoDB _id field to avoid serialization issues
-    for sale in sales:
-        if "_id" in sale:
-            del sale["_id"]
-    return sales
+    fields=a,b limits the returned fields (date, created_at and id are
+    always included).
+    """
+    user = await require_auth(request)
+    query = ledger_query(user.id, date, date_from, date_to)
+    return await ledger_page("fuel_sales", query, cursor, limit, fields)
 
 @api_router.post("/fuel-sales")
 async def create_fuel_sale(request: Request, sale_data: dict):
     """Create new fuel sale record"""
     user = await require_auth(request)
     
-    sale = FuelSale(
-        user_id=user.id,
-        **sale_data
-    )
-    
-    await db.fuel_sales.insert_one(sale.dict())
-    return {"message": "Fuel sale created", "id": sale.id}
+    sale, _ = await create_record("fuel_sales", user.id, sale_data)
+    return {"message": "Fuel sale created", "id": sale["id"]}
 
-@api_router.get("/credit-sales")
-async def get_credit_sales(request: Request, date: Optional[str] = None):
-    """Get credit sales for a specific date"""
+@api_router.post("/fuel-sales/bulk")
+async def create_fuel_sales_bulk(request: Request, items: List[dict]):
+    """Create many fuel sale records with one insert"""
     user = await require_auth(request)
+    return await bulk_create("fuel_sales", user.id, items)
+
+@api_router.post("/fuel-sales/shift")
+async def create_fuel_shift(request: Request, shift: FuelShift):
+    """Record a shift's nozzle readings, computing liters and amount.
     
-    query = {"user_id": user.id}
-    if date:
-        query["date"] = date
+    Each nozzle's opening reading must equal its previous closing reading
+    (or be left out to continue from it). Any inconsistency rejects the
+    whole shift with 422 and the per-row errors.
+    """
+    user = await require_auth(request)
+    try:
+        date_type.fromisoformat(shift.date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {shift.date}")
+    if len(shift.readings) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ITEMS} items per request")
+    
+    rows = [reading.dict() for reading in shift.readings]
+    nozzle_ids = list(dict.fromkeys(row["nozzle_id"] for row in rows))
+    closings, openings = await neighbouring_readings(repositories["fuel_sales"], user.id, nozzle_ids, shift.date)
+    computed, errors = compute_shift(rows, closings, openings)
+    if errors:
+        raise HTTPException(status_code=422, detail={"message": "Inconsistent readings", "errors": errors})
     
-    sales = await db.credit_sales.find(query).to_list(1000)
-    # Remove MongoDB _id field to avoid serialization issues
-    for sale in sales:
-        if "_id" in sale:
-            del sale["_id"]
-    return sales
+    result = await repositories["fuel_sales"].insert_many(user.id, [{**row, "date": shift.date} for row in computed])
+    result["sales"] = [
+        {"id": entry.get("id"), "nozzle_id": row["nozzle_id"], "opening_reading": row["opening_reading"],
+         "liters": row["liters"], "amount": row["amount"]}
+        for entry, row in zip(result["results"], computed)
+    ]
+    return result
+
+@api_router.get("/credit-sales")
+async def get_credit_sales(
+    request: Request,
+    date: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None
+):
+    """Get a page of credit sales, optionally for a date or from/to range.
+    
+    fields=a,b limits the returned fields (date, created_at and id are
+    always included).
+    """
+    user = await require_auth(request)
+    query = ledger_query(user.id, date, date_from, date_to)
+    return await ledger_page("credit_sales", query, cursor, limit, fields)
 
 @api_router.post("/credit-sales")
 async def create_credit_sale(request: Request, sale_data: dict):
     """Create new credit sale record"""
     user = await require_auth(request)
     
-    sale = CreditSale(
-        user_id=user.id,
-        **sale_data
-    )
-    
-    await db.credit_sales.insert_one(sale.dict())
-    return {"message": "Credit sale created", "id": sale.id}
+    sale, _ = await create_record("credit_sales", user.id, sale_data)
+    return {"message": "Credit sale created", "id": sale["id"]}
 
-@api_router.get("/income-expenses")
-async def get_income_expenses(request: Request, date: Optional[str] = None):
-    """Get income/expense records for a specific date"""
+@api_router.post("/credit-sales/bulk")
+async def create_credit_sales_bulk(request: Request, items: List[dict]):
+    """Create many credit sale records with one insert"""
     user = await require_auth(request)
+    return await bulk_create("credit_sales", user.id, items)
+
+@api_router.get("/income-expenses")
+async def get_income_expenses(
+    request: Request,
+    date: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None
+):
+    """Get a page of income/expense records, optionally for a date or from/to range.
     
-    query = {"user_id": user.id}
-    if date:
-        query["date"] = date
-    
-    records = await db.income_expenses.find(query).to_list(1000)
-    # Remove MongoDB _id field to avoid serialization issues
-    for record in records:
-        if "_id" in record:
-            del record["_id"]
-    return records
+    fields=a,b limits the returned fields (date, created_at and id are
+    always included).
+    """
+    user = await require_auth(request)
+    query = ledger_query(user.id, date, date_from, date_to)
+    return await ledger_page("income_expenses", query, cursor, limit, fields)
 
 @api_router.post("/income-expenses")
 async def create_income_expense(request: Request, record_data: dict):
     """Create new income/expense record"""
     user = await require_auth(request)
     
-    record = IncomeExpense(
-        user_id=user.id,
-        **record_data
-    )
-    
-    await db.income_expenses.insert_one(record.dict())
-    return {"message": "Income/expense record created", "id": record.id}
+    record, _ = await create_record("income_expenses", user.id, record_data)
+    return {"message": "Income/expense record created", "id": record["id"]}
+
+@api_router.post("/income-expenses/bulk")
+async def create_income_expenses_bulk(request: Request, items: List[dict]):
+    """Create many income/expense records with one insert"""
+    user = await require_auth(request)
+    return await bulk_create("income_expenses", user.id, items)
 
 @api_router.get("/fuel-rates")
-async def get_fuel_rates(request: Request, date: Optional[str] = None):
-    """Get fuel rates for a specific date"""
+async def get_fuel_rates(
+    request: Request,
+    date: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None
+):
+    """Get a page of fuel rates, optionally for a date or from/to range.
+    
+    fields=a,b limits the returned fields (date, created_at and id are
+    always included).
+    """
     user = await require_auth(request)
+    query = ledger_query(user.id, date, date_from, date_to)
+    return await ledger_page("fuel_rates", query, cursor, limit, fields)
+
+@api_router.get("/fuel-rates/effective")
+async def get_effective_fuel_rates(
+    request: Request,
+    date: str,
+    fuel_type: List[str] = Query([])
+):
+    """Rate in force on a date for each requested fuel type.
     
-    query = {"user_id": user.id}
-    if date:
-        query["date"] = date
+    Each rate comes with the dates it covers (effective_until is
+    exclusive; null means still in force). A fuel type with no rate on or
+    before the date gets rate null.
+    """
+    user = await require_auth(request)
+    try:
+        date_type.fromisoformat(date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {date}")
+    if not fuel_type:
+        raise HTTPException(status_code=400, detail="At least one fuel_type is required")
     
-    rates = await db.fuel_rates.find(query).to_list(1000)
-    # Remove MongoDB _id field to avoid serialization issues
-    for rate in rates:
-        if "_id" in rate:
-            del rate["_id"]
-    return rates
+    fuel_types = list(dict.fromkeys(fuel_type))
+    intervals = await asyncio.gather(*(
+        rate_cache.lookup(repositories["fuel_rates"], user.id, name, date) for name in fuel_types
+    ))
+    return {"date": date, "rates": dict(zip(fuel_types, intervals))}
 
 @api_router.post("/fuel-rates")
 async def create_fuel_rate(request: Request, rate_data: dict):
-    """Create/update fuel rate record"""
+    """Create/update the fuel rate for a date and fuel type"""
+    user = await require_auth(request)
+    
+    rate, created = await create_record("fuel_rates", user.id, rate_data)
+    rate_cache.invalidate(user.id)
+    return {"message": "Fuel rate created" if created else "Fuel rate updated", "id": rate["id"]}
+
+@api_router.post("/fuel-rates/bulk")
+async def create_fuel_rates_bulk(request: Request, items: List[dict]):
+    """Create/update many fuel rates with one write; the last item per date and fuel type wins"""
+    user = await require_auth(request)
+    result = await bulk_create("fuel_rates", user.id, items)
+    rate_cache.invalidate(user.id)
+    return result
+
+async def soft_delete(collection: str, user_id: str, record_id: str) -> dict:
+    """Turn a record into a tombstone so delta syncs can propagate the delete"""
+    current = await repositories[collection].soft_delete(user_id, record_id)
+    if not current:
+        raise HTTPException(status_code=404, detail="Record not found")
+    return {"message": "Record deleted", "id": record_id, "version": current.get("version", 1) + 1}
+
+@api_router.delete("/fuel-sales/{record_id}")
+async def delete_fuel_sale(request: Request, record_id: str):
+    """Delete a fuel sale record"""
+    user = await require_auth(request)
+    return await soft_delete("fuel_sales", user.id, record_id)
+
+@api_router.delete("/credit-sales/{record_id}")
+async def delete_credit_sale(request: Request, record_id: str):
+    """Delete a credit sale record"""
+    user = await require_auth(request)
+    return await soft_delete("credit_sales", user.id, record_id)
+
+@api_router.delete("/income-expenses/{record_id}")
+async def delete_income_expense(request: Request, record_id: str):
+    """Delete an income/expense record"""
+    user = await require_auth(request)
+    return await soft_delete("income_expenses", user.id, record_id)
+
+@api_router.delete("/fuel-rates/{record_id}")
+async def delete_fuel_rate(request: Request, record_id: str):
+    """Delete a fuel rate record"""
     user = await require_auth(request)
+    result = await soft_delete("fuel_rates", user.id, record_id)
+    rate_cache.invalidate(user.id)
+    return result
+
+@api_router.get("/summary")
+async def get_summary(
+    request: Request,
+    period: str = "day",
+    group_by: str = "fuel_type",
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    source: str = "rollups"
+):
+    """Totals per day, week or month across all ledgers.
+    
+    Fuel sales are further split per fuel type or nozzle (group_by). The
+    response size depends on the number of buckets, not the number of records.
+    Reads the daily rollups by default; source=raw aggregates the ledgers.
+    """
+    user = await require_auth(request)
+    
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of {', '.join(PERIODS)}")
+    if group_by not in FUEL_GROUPINGS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(FUEL_GROUPINGS)}")
+    if source not in SOURCES:
+        raise HTTPException(status_code=400, detail=f"source must be one of {', '.join(SOURCES)}")
+    
+    match = ledger_query(user.id, None, date_from, date_to)
+    buckets = await build_summary(get_db(), match, period=period, group_by=group_by, source=source)
+    return {
+        "period": period,
+        "group_by": group_by,
+        "from": date_from,
+        "to": date_to,
+        "buckets": buckets
+    }
+
+# Watermarks are set back by this much so writes still in flight when a
+# sync reads are picked up next time; re-sent documents are harmless
+SYNC_WATERMARK_LAG = timedelta(seconds=float(os.environ.get('SYNC_WATERMARK_LAG', '5')))
+
+@api_router.post("/sync/delta")
+async def sync_delta(request: Request, sync: SyncRequest):
+    """Two-way incremental sync for offline-first clients.
+    
+    Applies the client's local changes (upserts keyed by record id), then
+    returns up to limit records changed since the client's watermark,
+    tombstones included, in (updated_at, id) order across the ledgers.
+    Send the returned watermark and watermark_id as since and since_id next
+    time; while has_more is true, call again straight away for the rest.
+    Omit since for a full pull.
     
-    rate = FuelRate(
-        user_id=user.id,
-        **rate_data
+    A change to a stored record must carry the version it was edited from;
+    if the record has changed since, the change is reported as a conflict
+    with the stored record, for the client to merge and send again.
+    """
+    user = await require_auth(request)
+    
+    unknown = set(sync.changes) - set(LEDGER_MODELS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown collections: {', '.join(sorted(unknown))}")
+    if sum(len(items) for items in sync.changes.values()) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ITEMS} changes per request")
+    
+    now = datetime.now(timezone.utc)
+    # MongoDB keeps millisecond precision, so compare at that precision
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    
+    applied = {}
+    for collection, items in sync.changes.items():
+        applied[collection] = await repositories[collection].upsert_many(user.id, items)
+    if "fuel_rates" in sync.changes:
+        rate_cache.invalidate(user.id)
+    
+    since = sync.since
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # One page per ledger, merged and cut to one page overall
+    pages = await asyncio.gather(*(
+        repositories[collection].changed_since(user.id, since, sync.since_id if since else None, sync.limit + 1)
+        for collection in LEDGER_MODELS
+    ))
+    merged = sorted(
+        ((record["updated_at"], record["id"], collection, record)
+         for collection, page in zip(LEDGER_MODELS, pages) for record in page),
+        key=lambda entry: entry[:2]
     )
+    has_more = len(merged) > sync.limit
+    merged = merged[:sync.limit]
     
-    await db.fuel_rates.insert_one(rate.dict())
-    return {"message": "Fuel rate created", "id": rate.id}
+    changes = {collection: [] for collection in LEDGER_MODELS}
+    for _, _, collection, record in merged:
+        changes[collection].append(record)
+    
+    if has_more:
+        # Carry on strictly after the last record returned
+        updated_at, watermark_id = merged[-1][0], merged[-1][1]
+        watermark = (updated_at if updated_at.tzinfo else updated_at.replace(tzinfo=timezone.utc)).isoformat()
+    else:
+        watermark, watermark_id = (now - SYNC_WATERMARK_LAG).isoformat(), None
+    
+    return FastJSONResponse({
+        "watermark": watermark,
+        "watermark_id": watermark_id,
+        "has_more": has_more,
+        "applied": applied,
+        "changes": changes
+    })
+
+# Collections included in a user's backup, in output order
+BACKUP_COLLECTIONS = ["fuel_sales", "credit_sales", "income_expenses", "fuel_rates"]
+
+# Documents fetched per cursor batch while streaming a backup
+BACKUP_BATCH_SIZE = 500
+
+def ndjson_line(document: dict) -> bytes:
+    return dumps(document) + b"\n"
 
 # Sync endpoint for Gmail backup
 @api_router.post("/sync/backup")
@@ -387,39 +891,70 @@ async def backup_data(request: Request):
     """Backup all user data for Gmail sync"""
     user = await require_auth(request)
     
-    # Get all user data
-    fuel_sales = await db.fuel_sales.find({"user_id": user.id}).to_list(1000)
-    credit_sales = await db.credit_sales.find({"user_id": user.id}).to_list(1000)
-    income_expenses = await db.income_expenses.find({"user_id": user.id}).to_list(1000)
-    fuel_rates = await db.fuel_rates.find({"user_id": user.id}).to_list(1000)
-    
-    # Remove MongoDB _id fields to avoid serialization issues
-    for collection in [fuel_sales, credit_sales, income_expenses, fuel_rates]:
-        for item in collection:
-            if "_id" in item:
-                del item["_id"]
-    
-    backup_data = {
-        "user": user.dict(),
-        "fuel_sales": fuel_sales,
-        "credit_sales": credit_sales,
-        "income_expenses": income_expenses,
-        "fuel_rates": fuel_rates,
-        "backup_date": datetime.now(timezone.utc).isoformat()
+    async def fetch(collection: str):
+        started = time.perf_counter()
+        records = await repositories[collection].fetch_live(user.id)
+        return records, time.perf_counter() - started
+    
+    # The collections are independent, so fetch them concurrently
+    started = time.perf_counter()
+    results = await asyncio.gather(*(fetch(collection) for collection in BACKUP_COLLECTIONS))
+    total_ms = round((time.perf_counter() - started) * 1000, 2)
+    
+    timings_ms = {
+        collection: round(seconds * 1000, 2)
+        for collection, (_, seconds) in zip(BACKUP_COLLECTIONS, results)
     }
+    logger.info(f"Backup for {user.id} fetched in {total_ms} ms: {timings_ms}")
     
-    return backup_data
-
-# Include the router in the main app
-app.include_router(api_router)
+    backup_data = {"user": user.dict()}
+    for collection, (records, _) in zip(BACKUP_COLLECTIONS, results):
+        backup_data[collection] = records
+    backup_data["backup_date"] = datetime.now(timezone.utc).isoformat()
+    backup_data["backup_meta"] = {
+        "counts": {collection: len(backup_data[collection]) for collection in BACKUP_COLLECTIONS},
+        "fetch_ms": timings_ms,
+        "total_fetch_ms": total_ms
+    }
+    
+    response = FastJSONResponse(backup_data)
+    BACKUP_PAYLOAD_BYTES.observe(len(response.body), format="json")
+    return response
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@api_router.post("/sync/backup/stream")
+async def backup_data_stream(request: Request):
+    """Stream all user data as newline-delimited JSON.
+    
+    The first line holds the user and backup date, then one line per record
+    ({"collection": ..., "record": ...}) and a final line with per-collection
+    counts. Records are written straight from the database cursors, so
+    memory use doesn't grow with the size of the backup.
+    """
+    user = await require_auth(request)
+    
+    async def generate():
+        line = ndjson_line({
+            "type": "backup",
+            "user": user.dict(),
+            "backup_date": datetime.now(timezone.utc).isoformat()
+        })
+        size = len(line)
+        yield line
+        
+        counts = {}
+        for collection in BACKUP_COLLECTIONS:
+            counts[collection] = 0
+            async for record in repositories[collection].iterate_live(user.id, BACKUP_BATCH_SIZE):
+                counts[collection] += 1
+                line = ndjson_line({"collection": collection, "record": record})
+                size += len(line)
+                yield line
+        
+        line = ndjson_line({"type": "end", "counts": counts})
+        BACKUP_PAYLOAD_BYTES.observe(size + len(line), format="ndjson")
+        yield line
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 # Configure logging
 logging.basicConfig(
@@ -428,6 +963,64 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+async def build_indexes():
+    try:
+        await ensure_indexes(get_db())
+    except Exception as e:
+        logger.error(f"Index bootstrap failed: {str(e)}")
+
+async def warm_up_database(app: FastAPI):
+    seconds = await warm_up_until_ready(get_client())
+    app.state.ready = True
+    logger.info(f"MongoDB connection pool warmed up in {seconds * 1000:.0f} ms")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the outbound clients on startup and close them on shutdown.
+    
+    Pool warm-up and the index bootstrap run in the background so neither
+    holds up startup; readiness reports once the pool is warm.
+    """
+    app.state.ready = False
+    app.state.http_client = create_http_client()
+    app.state.warmup_task = asyncio.create_task(warm_up_database(app))
+    app.state.index_task = None
+    if os.environ.get('ENSURE_INDEXES', 'true').lower() == 'true':
+        app.state.index_task = asyncio.create_task(build_indexes())
+    
+    try:
+        yield
+    finally:
+        for task in (app.state.warmup_task, app.state.index_task):
+            if task is not None:
+                task.cancel()
+        await app.state.http_client.aclose()
+        app.state.http_client = None
+        close_client()
+
+def create_app() -> FastAPI:
+    """Build the ASGI app.
+    
+    Nothing here connects to MongoDB or the auth provider; clients are
+    created by the lifespan or on first use.
+    """
+    app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+    
+    # Include the router in the main app
+    app.include_router(api_router)
+    
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    
+    # Added last, so both wrap everything else and time the whole request;
+    # the last added (MetricsMiddleware) is the outermost
+    app.add_middleware(RequestStatsMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    return app
+
+app = create_app()
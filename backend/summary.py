@@ -0,0 +1,184 @@
+"""Server-side aggregation of the ledgers into per-period totals"""
+import asyncio
+
+from rollups import ROLLUP_COLLECTION, rollup_summary_pipeline
+
+PERIODS = ("day", "week", "month")
+SOURCES = ("rollups", "raw")
+FUEL_GROUPINGS = {"fuel_type": "$fuel_type", "nozzle": "$nozzle_id"}
+
+
+def period_expression(period: str):
+    """Bucket key for a ledger document's ISO ``date`` string"""
+    # Dates are ASCII, so byte offsets are character offsets ($substr is
+    # also what mongomock implements, which the benchmarks run against)
+    if period == "day":
+        return {"$substr": ["$date", 0, 10]}
+    if period == "month":
+        return {"$substr": ["$date", 0, 7]}
+    # ISO week, e.g. "2025-W02"
+    return {"$dateToString": {
+        "format": "%G-W%V",
+        "date": {"$dateFromString": {"dateString": {"$substr": ["$date", 0, 10]}, "format": "%Y-%m-%d"}}
+    }}
+
+
+def fuel_sales_pipeline(match: dict, period: str, group_by: str) -> list:
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"period": period_expression(period), "key": FUEL_GROUPINGS[group_by]},
+            "liters": {"$sum": "$liters"},
+            "amount": {"$sum": "$amount"},
+            "count": {"$sum": 1},
+        }},
+    ]
+
+
+def credit_sales_pipeline(match: dict, period: str) -> list:
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"period": period_expression(period)},
+            "amount": {"$sum": "$amount"},
+            "count": {"$sum": 1},
+        }},
+    ]
+
+
+def income_expenses_pipeline(match: dict, period: str) -> list:
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"period": period_expression(period), "type": "$type"},
+            "amount": {"$sum": "$amount"},
+            "count": {"$sum": 1},
+        }},
+    ]
+
+
+def fuel_rates_pipeline(match: dict, period: str) -> list:
+    return [
+        {"$match": match},
+        {"$sort": {"date": 1, "created_at": 1}},
+        {"$group": {
+            "_id": {"period": period_expression(period), "fuel_type": "$fuel_type"},
+            "min": {"$min": "$rate"},
+            "max": {"$max": "$rate"},
+            "last": {"$last": "$rate"},
+        }},
+    ]
+
+
+def empty_bucket(period: str) -> dict:
+    return {
+        "period": period,
+        "fuel": [],
+        "liters": 0.0,
+        "fuel_amount": 0.0,
+        "credit_amount": 0.0,
+        "credit_count": 0,
+        "income": 0.0,
+        "expense": 0.0,
+        "net": 0.0,
+        "rates": [],
+    }
+
+
+def merge_buckets(fuel: list, credit: list, income_expenses: list, rates: list) -> list:
+    """Combine the per-ledger group results into one list of period buckets"""
+    buckets = {}
+
+    def bucket(group_id: dict) -> dict:
+        period = group_id["period"]
+        if period not in buckets:
+            buckets[period] = empty_bucket(period)
+        return buckets[period]
+
+    for row in fuel:
+        entry = bucket(row["_id"])
+        entry["fuel"].append({
+            "key": row["_id"]["key"],
+            "liters": row["liters"],
+            "amount": row["amount"],
+            "count": row["count"],
+        })
+        entry["liters"] += row["liters"]
+        entry["fuel_amount"] += row["amount"]
+
+    for row in credit:
+        entry = bucket(row["_id"])
+        entry["credit_amount"] += row["amount"]
+        entry["credit_count"] += row["count"]
+
+    for row in income_expenses:
+        entry = bucket(row["_id"])
+        if row["_id"]["type"] in ("income", "expense"):
+            entry[row["_id"]["type"]] += row["amount"]
+
+    for row in rates:
+        bucket(row["_id"])["rates"].append({
+            "fuel_type": row["_id"]["fuel_type"],
+            "min": row["min"],
+            "max": row["max"],
+            "last": row["last"],
+        })
+
+    for entry in buckets.values():
+        entry["net"] = entry["income"] - entry["expense"]
+        entry["fuel"].sort(key=lambda item: str(item["key"]))
+        entry["rates"].sort(key=lambda item: str(item["fuel_type"]))
+
+    return [buckets[period] for period in sorted(buckets)]
+
+
+async def build_raw_summary(db, match: dict, period: str = "day", group_by: str = "fuel_type") -> list:
+    """Aggregate all four ledgers for ``match`` concurrently and merge by period"""
+    fuel, credit, income_expenses, rates = await asyncio.gather(
+        db.fuel_sales.aggregate(fuel_sales_pipeline(match, period, group_by)).to_list(None),
+        db.credit_sales.aggregate(credit_sales_pipeline(match, period)).to_list(None),
+        db.income_expenses.aggregate(income_expenses_pipeline(match, period)).to_list(None),
+        db.fuel_rates.aggregate(fuel_rates_pipeline(match, period)).to_list(None),
+    )
+    return merge_buckets(fuel, credit, income_expenses, rates)
+
+
+async def build_rollup_summary(db, match: dict, period: str = "day", group_by: str = "fuel_type") -> list:
+    """Same result as build_raw_summary, read from the precomputed daily rollups.
+
+    Reads O(days) rollup documents instead of every ledger record. Fuel rates
+    are not rolled up; they are already one small document per rate change.
+    """
+    grouped, rates = await asyncio.gather(
+        db[ROLLUP_COLLECTION].aggregate(
+            rollup_summary_pipeline(match, period_expression(period), FUEL_GROUPINGS[group_by])
+        ).to_list(None),
+        db.fuel_rates.aggregate(fuel_rates_pipeline(match, period)).to_list(None),
+    )
+
+    fuel, credit, income_expenses = [], [], []
+    for row in grouped:
+        group_id = row["_id"]
+        if group_id["ledger"] == "fuel_sales":
+            fuel.append({
+                "_id": {"period": group_id["period"], "key": group_id.get("key")},
+                "liters": row["liters"],
+                "amount": row["amount"],
+                "count": row["count"],
+            })
+        elif group_id["ledger"] == "credit_sales":
+            credit.append({"_id": {"period": group_id["period"]}, "amount": row["amount"], "count": row["count"]})
+        else:
+            income_expenses.append({
+                "_id": {"period": group_id["period"], "type": group_id.get("type")},
+                "amount": row["amount"],
+                "count": row["count"],
+            })
+    return merge_buckets(fuel, credit, income_expenses, rates)
+
+
+async def build_summary(db, match: dict, period: str = "day", group_by: str = "fuel_type",
+                        source: str = "rollups") -> list:
+    if source == "raw":
+        return await build_raw_summary(db, match, period, group_by)
+    return await build_rollup_summary(db, match, period, group_by)
@@ -311,7 +311,7 @@ class BackendTester:
             response = await self.client.get(f"{BACKEND_URL}/fuel-sales?date=2024-01-15", 
                                            headers=headers)
             if response.status_code == 200:
-                data = response.json()
+                data = response.json()["items"]
                 if len(data) > 0 and data[0]["fuel_type"] == "Petrol":
                     self.log_test("Data Persistence - Fuel Sales", True, 
                                 f"Successfully persisted and retrieved fuel sale data")
@@ -353,7 +353,7 @@ class BackendTester:
         response = await self.client.get(f"{BACKEND_URL}/fuel-sales?date=2024-01-15", 
                                        headers=headers)
         if response.status_code == 200:
-            data = response.json()
+            data = response.json()["items"]
             # Should only return records for 2024-01-15
             filtered_correctly = all(record["date"] == "2024-01-15" for record in data)
             if filtered_correctly and len(data) > 0:
@@ -366,6 +366,58 @@ class BackendTester:
             self.log_test("Date Filtering", False, 
                         f"Failed to test date filtering: {response.status_code}")
     
+    async def test_date_range_filtering(self):
+        """Test from/to date range filtering"""
+        print("\n📅 Testing Date Range Filtering...")
+        
+        headers = {"Authorization": f"Bearer {self.test_session_token}"}
+        
+        # Records on 2024-01-15 and 2024-01-16 exist from test_date_filtering
+        response = await self.client.get(f"{BACKEND_URL}/fuel-sales?from=2024-01-16&to=2024-01-31", 
+                                       headers=headers)
+        if response.status_code == 200:
+            data = response.json()["items"]
+            in_range = all("2024-01-16" <= record["date"] <= "2024-01-31" for record in data)
+            if in_range and len(data) > 0:
+                self.log_test("Date Range Filtering", True, 
+                            f"Successfully filtered {len(data)} records for date range")
+            else:
+                self.log_test("Date Range Filtering", False, 
+                            "Date range filtering not working correctly", data)
+        else:
+            self.log_test("Date Range Filtering", False, 
+                        f"Failed to test date range filtering: {response.status_code}")
+        
+        # Mixing date with from/to is rejected
+        response = await self.client.get(f"{BACKEND_URL}/fuel-sales?date=2024-01-15&from=2024-01-01", 
+                                       headers=headers)
+        if response.status_code == 400:
+            self.log_test("Date Range Validation", True, "Correctly rejected date combined with from/to")
+        else:
+            self.log_test("Date Range Validation", False, 
+                        f"Expected 400, got {response.status_code}")
+    
+    async def test_summary(self):
+        """Test aggregated summary endpoint"""
+        print("\n📊 Testing Summary Aggregation...")
+        
+        headers = {"Authorization": f"Bearer {self.test_session_token}"}
+        
+        response = await self.client.get(f"{BACKEND_URL}/summary?period=month&from=2024-01-01&to=2024-01-31", 
+                                       headers=headers)
+        if response.status_code == 200:
+            buckets = response.json()["buckets"]
+            january = next((bucket for bucket in buckets if bucket["period"] == "2024-01"), None)
+            if january and january["liters"] > 0 and any(item["key"] == "Petrol" for item in january["fuel"]):
+                self.log_test("Summary Aggregation", True, 
+                            f"Monthly summary returned {january['liters']} liters for 2024-01")
+            else:
+                self.log_test("Summary Aggregation", False, 
+                            "Monthly summary missing fuel totals", buckets)
+        else:
+            self.log_test("Summary Aggregation", False, 
+                        f"Expected 200, got {response.status_code}", response.text)
+    
     async def test_uuid_generation(self):
         """Test UUID generation and field mapping"""
         print("\n🆔 Testing UUID Generation...")
@@ -468,7 +520,7 @@ class BackendTester:
                                                headers=headers)
             
             if post_response.status_code == 200 and get_response.status_code == 200:
-                get_data = get_response.json()
+                get_data = get_response.json()["items"]
                 if len(get_data) > 0:
                     # Check if returned data has expected fields
                     record = get_data[0]
@@ -536,6 +588,8 @@ class BackendTester:
             # Comprehensive Data Persistence Tests
             await self.test_data_persistence_flow()
             await self.test_date_filtering()
+            await self.test_date_range_filtering()
+            await self.test_summary()
             await self.test_uuid_generation()
             await self.test_error_handling()
             await self.test_all_endpoints_format()
@@ -41,10 +41,35 @@ class ApiService {
     }
   }
 
+  // Follow next_cursor through a paginated listing and return all items
+  async requestAllPages(endpoint, params = {}) {
+    const items = [];
+    let cursor = null;
+
+    do {
+      const query = new URLSearchParams(params);
+      if (cursor) query.set('cursor', cursor);
+      const queryString = query.toString();
+      const page = await this.request(`${endpoint}${queryString ? `?${queryString}` : ''}`);
+      items.push(...page.items);
+      cursor = page.next_cursor;
+    } while (cursor);
+
+    return items;
+  }
+
+  // Either an exact date or an inclusive { from, to } range
+  dateParams(date, { from, to } = {}) {
+    if (date) return { date };
+    const params = {};
+    if (from) params.from = from;
+    if (to) params.to = to;
+    return params;
+  }
+
   // Fuel Sales API
-  async getFuelSales(date = null) {
-    const query = date ? `?date=${date}` : '';
-    return this.request(`/fuel-sales${query}`);
+  async getFuelSales(date = null, range = {}) {
+    return this.requestAllPages('/fuel-sales', this.dateParams(date, range));
   }
 
   async createFuelSale(saleData) {
@@ -55,9 +80,8 @@ class ApiService {
   }
 
   // Credit Sales API
-  async getCreditSales(date = null) {
-    const query = date ? `?date=${date}` : '';
-    return this.request(`/credit-sales${query}`);
+  async getCreditSales(date = null, range = {}) {
+    return this.requestAllPages('/credit-sales', this.dateParams(date, range));
   }
 
   async createCreditSale(saleData) {
@@ -68,9 +92,8 @@ class ApiService {
   }
 
   // Income/Expenses API
-  async getIncomeExpenses(date = null) {
-    const query = date ? `?date=${date}` : '';
-    return this.request(`/income-expenses${query}`);
+  async getIncomeExpenses(date = null, range = {}) {
+    return this.requestAllPages('/income-expenses', this.dateParams(date, range));
   }
 
   async createIncomeExpense(recordData) {
@@ -81,9 +104,8 @@ class ApiService {
   }
 
   // Fuel Rates API
-  async getFuelRates(date = null) {
-    const query = date ? `?date=${date}` : '';
-    return this.request(`/fuel-rates${query}`);
+  async getFuelRates(date = null, range = {}) {
+    return this.requestAllPages('/fuel-rates', this.dateParams(date, range));
   }
 
   async createFuelRate(rateData) {
@@ -93,6 +115,27 @@ class ApiService {
     });
   }
 
+  // Create many records at once; ledger is e.g. 'fuel-sales'
+  async createBulk(ledger, items) {
+    return this.request(`/${ledger}/bulk`, {
+      method: 'POST',
+      body: JSON.stringify(items),
+    });
+  }
+
+  // Soft-delete a record; ledger is e.g. 'fuel-sales'
+  async deleteRecord(ledger, id) {
+    return this.request(`/${ledger}/${id}`, {
+      method: 'DELETE',
+    });
+  }
+
+  // Aggregated totals per day/week/month
+  async getSummary({ period = 'day', groupBy = 'fuel_type', from, to } = {}) {
+    const query = new URLSearchParams({ period, group_by: groupBy, ...this.dateParams(null, { from, to }) });
+    return this.request(`/summary?${query.toString()}`);
+  }
+
   // Authentication API
   async getUser() {
     return this.request('/auth/me');
@@ -104,6 +147,17 @@ class ApiService {
     });
   }
 
+  // Push local changes and pull a page of changes since the last watermark;
+  // call again with the returned watermark/watermark_id while has_more is true.
+  // Edited records keep the version they were pulled at; a "conflict" result
+  // carries the server copy to merge before pushing again.
+  async syncDelta(since = null, changes = {}, sinceId = null) {
+    return this.request('/sync/delta', {
+      method: 'POST',
+      body: JSON.stringify({ since, since_id: sinceId, changes }),
+    });
+  }
+
   // Backup data for sync
   async backupData() {
     return this.request('/sync/backup', {
@@ -137,7 +137,7 @@ class FuelRatesTester:
             response = await self.client.get(f"{BACKEND_URL}/fuel-rates", headers=headers)
             
             if response.status_code == 200:
-                data = response.json()
+                data = response.json()["items"]
                 if isinstance(data, list) and len(data) == 0:
                     self.log_test("GET Fuel Rates - Empty", True, "Successfully returns empty array")
                 else:
@@ -219,7 +219,7 @@ class FuelRatesTester:
             response = await self.client.get(f"{BACKEND_URL}/fuel-rates", headers=headers)
             
             if response.status_code == 200:
-                data = response.json()
+                data = response.json()["items"]
                 if isinstance(data, list) and len(data) >= 2:
                     # Check if we have both Petrol and Diesel rates
                     fuel_types = [rate["fuel_type"] for rate in data]
@@ -255,7 +255,7 @@ class FuelRatesTester:
             response = await self.client.get(f"{BACKEND_URL}/fuel-rates?date=2025-10-01", headers=headers)
             
             if response.status_code == 200:
-                data = response.json()
+                data = response.json()["items"]
                 if isinstance(data, list):
                     # All returned rates should be for the specified date
                     correct_dates = all(rate["date"] == "2025-10-01" for rate in data)
@@ -332,7 +332,7 @@ class FuelRatesTester:
                     get_response = await self.client.get(f"{BACKEND_URL}/fuel-rates?date=2025-10-01", 
                                                        headers=headers)
                     if get_response.status_code == 200:
-                        retrieved_data = get_response.json()
+                        retrieved_data = get_response.json()["items"]
                         if len(retrieved_data) > 0:
                             rate_record = retrieved_data[-1]  # Get the last created record
                             
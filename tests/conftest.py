@@ -0,0 +1,45 @@
+"""
+In-process API fixtures: the app is built with server.create_app() and
+driven over httpx's ASGI transport against a fresh mongomock database per
+test (mongomock-motor, from backend/requirements.txt).
+"""
+
+import sys
+from pathlib import Path
+
+import mongomock_motor
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend" / "benchmarks"))
+
+from common import app_client, create_session  # noqa: E402  (also puts backend/ on sys.path)
+
+USER_ID = "test-user"
+TOKEN = "test_session"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    from indexes import ensure_indexes
+
+    database = mongomock_motor.AsyncMongoMockClient()["test_database"]
+    # Unique indexes back the natural-key upserts
+    await ensure_indexes(database)
+    return database
+
+
+@pytest.fixture
+async def api(db):
+    """httpx client for the API, authenticated as USER_ID"""
+    import server
+
+    server.session_cache.clear()
+    server.rate_cache.clear()
+    await create_session(db, USER_ID, TOKEN)
+    async with app_client(db, TOKEN) as client:
+        yield client
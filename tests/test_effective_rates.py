@@ -0,0 +1,84 @@
+"""/fuel-rates/effective: the rate in force on a date and the interval it covers"""
+
+import pytest
+
+from rates import RateIntervals
+
+pytestmark = pytest.mark.anyio
+
+
+async def set_rate(api, date: str, rate: float, fuel_type: str = "Petrol"):
+    response = await api.post("/fuel-rates", json={"date": date, "fuel_type": fuel_type, "rate": rate})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def effective(api, date: str, *fuel_types: str) -> dict:
+    response = await api.get("/fuel-rates/effective", params={"date": date, "fuel_type": list(fuel_types)})
+    assert response.status_code == 200, response.text
+    return response.json()["rates"]
+
+
+async def test_rate_before_between_and_after_changes(api):
+    await set_rate(api, "2024-01-10", 100.0)
+    await set_rate(api, "2024-02-01", 105.0)
+
+    before = await effective(api, "2024-01-01", "Petrol")
+    assert before["Petrol"]["rate"] is None
+    assert before["Petrol"]["effective_until"] == "2024-01-10"
+
+    for date in ("2024-01-10", "2024-01-20", "2024-01-31"):
+        between = await effective(api, date, "Petrol")
+        assert between["Petrol"]["rate"] == 100.0
+        assert (between["Petrol"]["effective_from"], between["Petrol"]["effective_until"]) == ("2024-01-10", "2024-02-01")
+
+    after = await effective(api, "2024-03-01", "Petrol")
+    assert after["Petrol"]["rate"] == 105.0
+    assert after["Petrol"]["effective_until"] is None
+
+
+async def test_fuel_types_are_independent(api):
+    await set_rate(api, "2024-01-01", 100.0)
+    await set_rate(api, "2024-01-01", 90.0, fuel_type="Diesel")
+
+    rates = await effective(api, "2024-01-05", "Petrol", "Diesel", "CNG")
+    assert {name: interval["rate"] for name, interval in rates.items()} == {"Petrol": 100.0, "Diesel": 90.0, "CNG": None}
+
+
+async def test_writes_invalidate_cached_intervals(api):
+    import server
+
+    rate = await set_rate(api, "2024-01-01", 100.0)
+    hits = server.rate_cache.hits
+    assert (await effective(api, "2024-01-15", "Petrol"))["Petrol"]["rate"] == 100.0
+    assert (await effective(api, "2024-01-20", "Petrol"))["Petrol"]["rate"] == 100.0
+    assert server.rate_cache.hits == hits + 1
+
+    await set_rate(api, "2024-01-10", 110.0)
+    assert (await effective(api, "2024-01-15", "Petrol"))["Petrol"]["rate"] == 110.0
+    assert (await effective(api, "2024-01-05", "Petrol"))["Petrol"]["effective_until"] == "2024-01-10"
+
+    await set_rate(api, "2024-01-10", 120.0)
+    assert (await effective(api, "2024-01-15", "Petrol"))["Petrol"]["rate"] == 120.0
+
+    response = await api.delete(f"/fuel-rates/{rate['id']}")
+    assert response.status_code == 200, response.text
+    assert (await effective(api, "2024-01-05", "Petrol"))["Petrol"]["rate"] is None
+
+
+async def test_effective_requires_fuel_type_and_valid_date(api):
+    assert (await api.get("/fuel-rates/effective", params={"date": "2024-01-01"})).status_code == 400
+    response = await api.get("/fuel-rates/effective", params={"date": "01/01/2024", "fuel_type": "Petrol"})
+    assert response.status_code == 400
+
+
+def test_intervals_bisect_on_start_dates():
+    intervals = RateIntervals()
+    intervals.add("Petrol", {"rate": 100.0, "effective_from": "2024-01-10", "effective_until": "2024-02-01"})
+    intervals.add("Petrol", {"rate": None, "effective_from": None, "effective_until": "2024-01-10"})
+
+    assert intervals.find("Petrol", "2024-01-01")["rate"] is None
+    assert intervals.find("Petrol", "2024-01-31")["rate"] == 100.0
+    # Past the last known interval: not cached yet
+    assert intervals.find("Petrol", "2024-02-01") is None
+    assert intervals.find("Diesel", "2024-01-15") is None
@@ -0,0 +1,120 @@
+"""Fuel rates are unique per (date, fuel_type): every write path upserts on that key"""
+
+from datetime import datetime, timezone
+
+import mongomock_motor
+import pytest
+
+from migrations import dedupe_fuel_rates
+
+pytestmark = pytest.mark.anyio
+
+
+def fuel_rate(rate: float, date: str = "2024-01-01", **fields) -> dict:
+    return {"date": date, "fuel_type": "Petrol", "rate": rate, **fields}
+
+
+async def stored_rates(db) -> list:
+    return await db.fuel_rates.find({}, {"_id": 0}).to_list(None)
+
+
+async def test_create_updates_the_rate_holding_the_key(api, db):
+    first = await api.post("/fuel-rates", json=fuel_rate(100.0))
+    second = await api.post("/fuel-rates", json=fuel_rate(105.0))
+
+    assert first.json()["message"] == "Fuel rate created"
+    assert second.json() == {"message": "Fuel rate updated", "id": first.json()["id"]}
+    [record] = await stored_rates(db)
+    assert (record["rate"], record["version"]) == (105.0, 2)
+
+
+async def test_bulk_collisions_keep_the_last_item(api, db):
+    await api.post("/fuel-rates", json=fuel_rate(100.0))
+
+    response = await api.post("/fuel-rates/bulk", json=[fuel_rate(101.0), fuel_rate(102.0),
+                                                        fuel_rate(90.0, date="2024-01-02")])
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["inserted"], result["updated"], result["failed"]) == (1, 1, 0)
+    assert [entry["status"] for entry in result["results"]] == ["updated", "updated", "created"]
+    assert result["results"][0]["id"] == result["results"][1]["id"]
+
+    rates = {record["date"]: record["rate"] for record in await stored_rates(db)}
+    assert rates == {"2024-01-01": 102.0, "2024-01-02": 90.0}
+
+
+async def test_sync_folds_new_ids_into_the_stored_key(api, db):
+    created = await api.post("/fuel-rates", json=fuel_rate(100.0))
+    stored_id = created.json()["id"]
+
+    # Set offline while another device had already set that day's rate
+    response = await api.post("/sync/delta", json={"changes": {"fuel_rates": [fuel_rate(110.0, id="offline")]}})
+    [result] = response.json()["applied"]["fuel_rates"]
+    assert (result["status"], result["id"], result["client_id"]) == ("conflict", stored_id, "offline")
+    assert result["server"]["rate"] == 100.0
+
+    response = await api.post("/sync/delta", json={"changes": {"fuel_rates": [
+        fuel_rate(110.0, id="offline", version=result["server"]["version"])
+    ]}})
+    [result] = response.json()["applied"]["fuel_rates"]
+    assert result == {"index": 0, "status": "applied", "id": stored_id, "version": 2, "client_id": "offline"}
+    [record] = await stored_rates(db)
+    assert (record["id"], record["rate"]) == (stored_id, 110.0)
+
+
+async def test_sync_collisions_within_a_batch(api, db):
+    changes = [fuel_rate(100.0, id="phone"), fuel_rate(101.0, id="tablet")]
+    response = await api.post("/sync/delta", json={"changes": {"fuel_rates": changes}})
+
+    assert response.json()["applied"]["fuel_rates"] == [
+        {"index": 0, "status": "superseded", "id": "phone", "superseded_by": 1, "client_id": "phone"},
+        {"index": 1, "status": "applied", "id": "phone", "version": 1, "client_id": "tablet"},
+    ]
+    [record] = await stored_rates(db)
+    assert (record["id"], record["rate"]) == ("phone", 101.0)
+
+
+async def test_sync_cannot_move_a_rate_onto_a_taken_key(api, db):
+    await api.post("/fuel-rates", json=fuel_rate(100.0))
+    moved = await api.post("/fuel-rates", json=fuel_rate(90.0, date="2024-01-02"))
+
+    change = fuel_rate(90.0, id=moved.json()["id"], version=1)
+    response = await api.post("/sync/delta", json={"changes": {"fuel_rates": [change]}})
+    assert response.json()["applied"]["fuel_rates"][0]["status"] == "error"
+    rates = {record["date"]: record["rate"] for record in await stored_rates(db)}
+    assert rates == {"2024-01-01": 100.0, "2024-01-02": 90.0}
+
+
+async def test_dedupe_keeps_the_latest_live_rate():
+    # Before the unique index exists
+    db = mongomock_motor.AsyncMongoMockClient()["dedupe_database"]
+    base = {"user_id": "test-user", "date": "2024-01-01", "fuel_type": "Petrol", "version": 1,
+            "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc)}
+    await db.fuel_rates.insert_many([
+        {**base, "id": "old", "rate": 100.0, "deleted": False, "updated_at": datetime(2024, 1, 1, tzinfo=timezone.utc)},
+        {**base, "id": "new", "rate": 101.0, "deleted": False, "updated_at": datetime(2024, 1, 2, tzinfo=timezone.utc)},
+        {**base, "id": "gone", "rate": 102.0, "deleted": True, "updated_at": datetime(2024, 1, 3, tzinfo=timezone.utc)},
+        {**base, "id": "other", "rate": 90.0, "deleted": False, "date": "2024-01-02",
+         "updated_at": datetime(2024, 1, 1, tzinfo=timezone.utc)},
+    ])
+
+    assert await dedupe_fuel_rates(db) == {"groups": 1, "removed": 2}
+    assert await dedupe_fuel_rates(db) == {"groups": 0, "removed": 0}
+    survivors = {record["id"]: record["version"] for record in await stored_rates(db)}
+    assert survivors == {"new": 2, "other": 1}
+
+
+async def test_dedupe_ranks_legacy_records_by_age():
+    db = mongomock_motor.AsyncMongoMockClient()["dedupe_database"]
+    key = {"user_id": "test-user", "date": "2024-01-01", "fuel_type": "Petrol"}
+    await db.fuel_rates.insert_many([
+        # Written before change tracking: no deleted, version or updated_at
+        {**key, "id": "legacy", "rate": 100.0, "created_at": datetime(2023, 12, 1, tzinfo=timezone.utc)},
+        {**key, "id": "newer", "rate": 105.0, "deleted": False, "version": 1,
+         "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+         "updated_at": datetime(2024, 1, 1, tzinfo=timezone.utc)},
+    ])
+
+    assert await dedupe_fuel_rates(db) == {"groups": 1, "removed": 1}
+    [record] = await stored_rates(db)
+    assert (record["id"], record["rate"]) == ("newer", 105.0)
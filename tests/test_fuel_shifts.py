@@ -0,0 +1,76 @@
+"""Fuel sales: liters and amount derived from readings, shifts chained per nozzle"""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def reading(closing: float, opening: float = None, nozzle_id: str = "N1", **fields) -> dict:
+    row = {"nozzle_id": nozzle_id, "fuel_type": "Petrol", "closing_reading": closing, "rate": 100.0, **fields}
+    if opening is not None:
+        row["opening_reading"] = opening
+    return row
+
+
+async def record_shift(api, date: str, *readings):
+    return await api.post("/fuel-sales/shift", json={"date": date, "readings": list(readings)})
+
+
+async def test_shift_continues_from_previous_closing(api):
+    first = await record_shift(api, "2024-01-01", reading(1100.0, opening=1000.0))
+    assert first.status_code == 200, first.text
+
+    second = await record_shift(api, "2024-01-02", reading(1150.0))
+    assert second.status_code == 200, second.text
+    [sale] = second.json()["sales"]
+    assert sale["opening_reading"] == 1100.0
+    assert sale["liters"] == 50.0
+    assert sale["amount"] == 5000.0
+
+
+async def test_opening_mismatch_rejects_whole_shift(api, db):
+    await record_shift(api, "2024-01-01", reading(1100.0, opening=1000.0))
+
+    response = await record_shift(api, "2024-01-02",
+                                  reading(510.0, opening=500.0, nozzle_id="N2"),
+                                  reading(1200.0, opening=1090.0))
+    assert response.status_code == 422
+    [error] = response.json()["detail"]["errors"]
+    assert error["index"] == 1 and error["nozzle_id"] == "N1"
+    assert await db.fuel_sales.count_documents({"date": "2024-01-02"}) == 0
+
+
+async def test_backdated_shift_must_close_at_next_opening(api, db):
+    first = await record_shift(api, "2024-01-01", reading(1100.0, opening=1000.0))
+    third = await record_shift(api, "2024-01-03", reading(1200.0))
+    assert (first.status_code, third.status_code) == (200, 200)
+
+    gap = await record_shift(api, "2024-01-02", reading(1150.0))
+    assert gap.status_code == 422
+    assert "next stored opening_reading 1100.0" in gap.json()["detail"]["errors"][0]["error"]
+    assert await db.fuel_sales.count_documents({"date": "2024-01-02"}) == 0
+
+    idle = await record_shift(api, "2024-01-02", reading(1100.0))
+    assert idle.status_code == 200, idle.text
+
+
+async def test_sent_amounts_are_checked(api):
+    sale = {"date": "2024-01-01", "fuel_type": "Petrol", "nozzle_id": "N1",
+            "opening_reading": 1000.0, "closing_reading": 1010.0, "rate": 100.0}
+
+    wrong = await api.post("/fuel-sales", json={**sale, "liters": 12.0, "amount": 1000.0})
+    assert wrong.status_code == 422
+
+    shift = await record_shift(api, "2024-01-02", reading(1020.0, opening=1010.0, amount=999.0))
+    assert shift.status_code == 422
+
+
+async def test_missing_amounts_are_derived(api, db):
+    sale = {"date": "2024-01-01", "fuel_type": "Petrol", "nozzle_id": "N1",
+            "opening_reading": 1000.0, "closing_reading": 1010.0, "rate": 100.0, "liters": None}
+
+    response = await api.post("/fuel-sales", json=sale)
+    assert response.status_code == 200, response.text
+    stored = await db.fuel_sales.find_one({"id": response.json()["id"]})
+    assert stored["liters"] == 10.0
+    assert stored["amount"] == 1000.0
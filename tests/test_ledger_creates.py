@@ -0,0 +1,23 @@
+"""Single-record creates of every ledger"""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("path, record", [
+    ("/fuel-sales", {"date": "2024-01-01", "fuel_type": "Petrol"}),
+    ("/credit-sales", {"date": "2024-01-01"}),
+    ("/income-expenses", {"date": "2024-01-01", "type": "income"}),
+    ("/fuel-rates", {"date": "2024-01-01", "fuel_type": "Petrol"}),
+])
+async def test_creates_reject_missing_fields(api, path, record):
+    response = await api.post(path, json=record)
+    assert response.status_code == 422
+    assert all(error["type"] == "missing" for error in response.json()["detail"])
+
+
+async def test_create_with_a_stored_id(api):
+    sale = {"id": "s1", "date": "2024-01-01", "customer_name": "Customer", "amount": 10.0}
+    assert (await api.post("/credit-sales", json=sale)).status_code == 200
+    assert (await api.post("/credit-sales", json=sale)).status_code == 409
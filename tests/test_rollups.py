@@ -0,0 +1,89 @@
+"""Daily rollups kept by the write paths, and the /summary read from them"""
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from indexes import EXPECTED_INDEXES
+from rollups import ROLLUP_COLLECTION, apply_rollups, rollup_key
+
+pytestmark = pytest.mark.anyio
+
+
+def fuel_sale(date: str = "2024-01-01", nozzle_id: str = "N1", **fields) -> dict:
+    return {"date": date, "fuel_type": "Petrol", "nozzle_id": nozzle_id, "opening_reading": 1000.0,
+            "closing_reading": 1010.0, "rate": 100.0, **fields}
+
+
+async def summaries(api, **params) -> tuple:
+    rollups = await api.get("/summary", params=params)
+    raw = await api.get("/summary", params={**params, "source": "raw"})
+    assert rollups.status_code == raw.status_code == 200, rollups.text
+    return rollups.json(), raw.json()
+
+
+def test_rollup_key_is_the_unique_index_key():
+    [index] = [index for index in EXPECTED_INDEXES[ROLLUP_COLLECTION] if index.document.get("unique")]
+    index_fields = list(index.document["key"])
+
+    for ledger, record in (("fuel_sales", {"fuel_type": "Petrol", "nozzle_id": "N1"}),
+                           ("credit_sales", {}),
+                           ("income_expenses", {"type": "income"})):
+        key = rollup_key(ledger, {"user_id": "u", "date": "2024-01-01", **record})
+        assert sorted(key) == sorted(index_fields)
+
+
+async def test_racing_first_writes_of_a_rollup(db):
+    rollups = db[ROLLUP_COLLECTION]
+    record = {"user_id": "u", "date": "2024-01-01", "amount": 10.0}
+    raced = []
+
+    class RacedDatabase:
+        """The first bulk_write loses the insert of the rollup to another request"""
+
+        def __getitem__(self, name):
+            return self
+
+        async def bulk_write(self, operations, ordered=True):
+            if not raced:
+                raced.append(True)
+                await apply_rollups(db, "credit_sales", [record])
+                raise BulkWriteError({"writeErrors": [{"index": 0, "code": 11000, "errmsg": "E11000 duplicate key"}]})
+            return await rollups.bulk_write(operations, ordered=ordered)
+
+    await apply_rollups(RacedDatabase(), "credit_sales", [record])
+
+    [rollup] = await rollups.find({}, {"_id": 0}).to_list(None)
+    assert (rollup["count"], rollup["amount"]) == (2, 20.0)
+
+
+async def test_rollup_summary_matches_raw(api):
+    for sale in (fuel_sale(), fuel_sale(nozzle_id="N2"), fuel_sale(date="2024-01-02")):
+        assert (await api.post("/fuel-sales", json=sale)).status_code == 200
+    await api.post("/credit-sales", json={"date": "2024-01-01", "customer_name": "C", "amount": 50.0})
+    await api.post("/income-expenses", json={"date": "2024-01-02", "type": "expense", "category": "Power",
+                                             "amount": 20.0})
+
+    january = {"from": "2024-01-01", "to": "2024-01-31"}
+    rollups, raw = await summaries(api, period="day", group_by="nozzle", **january)
+    assert rollups == raw
+
+
+async def test_deleted_days_leave_no_buckets(api, db):
+    assert (await api.post("/fuel-sales", json=fuel_sale(date="2024-01-02"))).status_code == 200
+    deleted = await api.post("/fuel-sales", json=fuel_sale())
+    assert (await api.delete(f"/fuel-sales/{deleted.json()['id']}")).status_code == 200
+
+    rollups, raw = await summaries(api, period="day")
+    assert [bucket["period"] for bucket in rollups["buckets"]] == ["2024-01-02"]
+    assert rollups == raw
+    assert await db[ROLLUP_COLLECTION].count_documents({"date": "2024-01-01"}) == 0
+
+
+async def test_empty_rollups_are_still_hidden(api, db):
+    # Left behind before emptied rollups were removed
+    await db[ROLLUP_COLLECTION].insert_one(
+        {**rollup_key("credit_sales", {"user_id": "test-user", "date": "2024-01-03"}), "count": 0, "amount": 0.0}
+    )
+
+    rollups, raw = await summaries(api, period="day")
+    assert rollups["buckets"] == raw["buckets"] == []
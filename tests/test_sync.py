@@ -0,0 +1,203 @@
+"""Delta sync: pushes keyed by record id and paged pulls"""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def credit_sale(record_id: str, amount: float = 100.0, **fields) -> dict:
+    return {"id": record_id, "date": "2024-01-01", "customer_name": "Customer", "amount": amount, **fields}
+
+
+async def sync(api, **body) -> dict:
+    response = await api.post("/sync/delta", json=body)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_replayed_push_is_unchanged(api):
+    first = await sync(api, changes={"credit_sales": [credit_sale("a")]})
+    assert first["applied"]["credit_sales"] == [{"index": 0, "status": "applied", "id": "a", "version": 1}]
+
+    replay = await sync(api, changes={"credit_sales": [credit_sale("a")]})
+    assert replay["applied"]["credit_sales"] == [{"index": 0, "status": "unchanged", "id": "a"}]
+
+    edit = await sync(api, changes={"credit_sales": [credit_sale("a", amount=150.0, version=1)]})
+    assert edit["applied"]["credit_sales"][0]["version"] == 2
+
+
+async def test_stale_edit_is_a_conflict(api, db):
+    await sync(api, changes={"credit_sales": [credit_sale("s")]})
+    await sync(api, changes={"credit_sales": [credit_sale("s", amount=150.0, version=1)]})
+
+    # A delayed replay of another device's edit of version 1
+    replay = await sync(api, changes={"credit_sales": [credit_sale("s", amount=120.0, version=1)]})
+    [result] = replay["applied"]["credit_sales"]
+    assert (result["status"], result["id"]) == ("conflict", "s")
+    assert (result["server"]["amount"], result["server"]["version"]) == (150.0, 2)
+
+    unversioned = await sync(api, changes={"credit_sales": [credit_sale("s", amount=120.0)]})
+    assert unversioned["applied"]["credit_sales"][0]["status"] == "conflict"
+    stored = await db.credit_sales.find_one({"id": "s"})
+    assert (stored["amount"], stored["version"]) == (150.0, 2)
+
+
+async def test_duplicate_ids_in_one_push(api, db):
+    result = await sync(api, changes={"credit_sales": [credit_sale("x", 1.0), credit_sale("x", 2.0)]})
+
+    assert result["applied"]["credit_sales"] == [
+        {"index": 0, "status": "superseded", "id": "x", "superseded_by": 1, "client_id": "x"},
+        {"index": 1, "status": "applied", "id": "x", "version": 1},
+    ]
+    stored = await db.credit_sales.find({"id": "x"}).to_list(None)
+    assert [record["amount"] for record in stored] == [2.0]
+
+
+async def test_invalid_items_are_reported_per_item(api):
+    result = await sync(api, changes={"credit_sales": [{"date": "2024-01-01"}, credit_sale("ok")]})
+
+    statuses = [entry["status"] for entry in result["applied"]["credit_sales"]]
+    assert statuses == ["error", "applied"]
+
+
+async def test_pull_pages_across_ledgers(api):
+    rates = [{"id": f"r{i}", "date": f"2024-01-0{i + 1}", "fuel_type": "Petrol", "rate": 100.0 + i}
+             for i in range(5)]
+    sales = [credit_sale(f"c{i}") for i in range(7)]
+    page = await sync(api, changes={"credit_sales": sales, "fuel_rates": rates}, limit=4)
+
+    pulled, pages = [], 1
+    while True:
+        records = [record for ledger in page["changes"].values() for record in ledger]
+        assert len(records) <= 4
+        pulled.extend(record["id"] for record in records)
+        if not page["has_more"]:
+            assert page["watermark_id"] is None
+            break
+        assert page["watermark_id"] in [record["id"] for record in records]
+        page = await sync(api, since=page["watermark"], since_id=page["watermark_id"], limit=4)
+        pages += 1
+
+    assert pages == 3
+    assert sorted(pulled) == sorted([record["id"] for record in rates + sales])
+
+
+async def test_pull_skips_changes_before_watermark(api):
+    await sync(api, changes={"credit_sales": [credit_sale("old")]})
+    later = await sync(api, since="2999-01-01T00:00:00+00:00")
+
+    assert later["has_more"] is False
+    assert later["changes"]["credit_sales"] == []
+
+
+async def test_push_is_capped(api):
+    import server
+
+    sales = [credit_sale(f"c{i}") for i in range(server.MAX_BULK_ITEMS + 1)]
+    response = await api.post("/sync/delta", json={"changes": {"credit_sales": sales}})
+    assert response.status_code == 413
+
+
+async def test_unknown_collection(api):
+    response = await api.post("/sync/delta", json={"changes": {"users": []}})
+    assert response.status_code == 400
+
+
+async def test_delete_then_resync(api, db):
+    await sync(api, changes={"credit_sales": [credit_sale("d")]})
+    response = await api.delete("/credit-sales/d")
+    assert response.status_code == 200, response.text
+
+    pulled = await sync(api)
+    [tombstone] = pulled["changes"]["credit_sales"]
+    assert tombstone["id"] == "d" and tombstone["deleted"] is True
+    listed = await api.get("/credit-sales")
+    assert "d" not in [record["id"] for record in listed.json()["items"]]
+
+    # An edit made before the delete doesn't bring the record back
+    stale = await sync(api, changes={"credit_sales": [credit_sale("d", amount=150.0, version=1)]})
+    assert stale["applied"]["credit_sales"][0]["status"] == "conflict"
+    assert (await db.credit_sales.find_one({"id": "d"}))["deleted"] is True
+
+    revived = await sync(api, changes={"credit_sales": [credit_sale("d", deleted=False, version=tombstone["version"])]})
+    assert revived["applied"]["credit_sales"][0]["status"] == "applied"
+    stored = await db.credit_sales.find_one({"id": "d"})
+    assert stored["deleted"] is False
+    assert stored["deleted_at"] is None
+
+
+def race(monkeypatch, collection_name: str, before_write):
+    """Run ``before_write`` (another push landing) between a sync push's
+    read of the stored records and its bulk write"""
+    from repository import LedgerRepository
+
+    import server
+
+    repository = server.repositories[collection_name]
+    collection = repository.collection
+
+    class RacedCollection:
+        def __getattr__(self, name):
+            return getattr(collection, name)
+
+        async def bulk_write(self, operations, ordered=True):
+            return await before_write(collection, operations, ordered)
+
+    monkeypatch.setattr(LedgerRepository, "collection",
+                        property(lambda self: RacedCollection() if self is repository else self.db[self.name]))
+    return repository
+
+
+async def test_concurrent_push_of_a_new_record(api, db, monkeypatch):
+    from pymongo.errors import BulkWriteError
+
+    sale = credit_sale("r")
+
+    async def insert_first(collection, operations, ordered):
+        # MongoDB's answer when the other push's upsert inserted it first
+        await collection.insert_one(repository.build("test-user", sale))
+        raise BulkWriteError({"writeErrors": [{"index": 0, "code": 11000, "errmsg": "E11000 duplicate key"}]})
+
+    repository = race(monkeypatch, "credit_sales", insert_first)
+    result = await sync(api, changes={"credit_sales": [sale]})
+
+    assert result["applied"]["credit_sales"] == [{"index": 0, "status": "unchanged", "id": "r"}]
+    assert await db.credit_sales.count_documents({"id": "r"}) == 1
+
+
+async def test_edit_racing_another_edit_is_a_conflict(api, db, monkeypatch):
+    await sync(api, changes={"credit_sales": [credit_sale("c")]})
+
+    async def edit_first(collection, operations, ordered):
+        await collection.update_one({"id": "c"}, {"$set": {"amount": 175.0}, "$inc": {"version": 1}})
+        return await collection.bulk_write(operations, ordered=ordered)
+
+    race(monkeypatch, "credit_sales", edit_first)
+    result = await sync(api, changes={"credit_sales": [credit_sale("c", amount=150.0, version=1)]})
+
+    [entry] = result["applied"]["credit_sales"]
+    assert (entry["status"], entry["server"]["amount"], entry["server"]["version"]) == ("conflict", 175.0, 2)
+    assert await db.credit_sales.count_documents({"id": "c"}) == 1
+
+
+async def test_record_ids_are_unique_per_user(db):
+    from pymongo.errors import DuplicateKeyError
+
+    await db.credit_sales.insert_one(credit_sale("u", user_id="test-user"))
+    with pytest.raises(DuplicateKeyError):
+        await db.credit_sales.insert_one(credit_sale("u", user_id="test-user"))
+    await db.credit_sales.insert_one(credit_sale("u", user_id="someone-else"))
+
+
+async def test_creates_ignore_deleted(api, db):
+    created = await api.post("/credit-sales", json=credit_sale("live", deleted=True))
+    assert created.status_code == 200, created.text
+    bulk = await api.post("/credit-sales/bulk", json=[credit_sale("bulk", deleted=True)])
+    assert bulk.status_code == 200, bulk.text
+    rate = await api.post("/fuel-rates", json={"date": "2024-01-01", "fuel_type": "Petrol", "rate": 100.0,
+                                               "deleted": True})
+    assert rate.status_code == 200, rate.text
+
+    listed = await api.get("/credit-sales")
+    assert sorted(record["id"] for record in listed.json()["items"]) == ["bulk", "live"]
+    assert await db.fuel_rates.count_documents({"deleted": True}) == 0